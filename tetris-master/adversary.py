@@ -1,6 +1,11 @@
+from collections import deque
 from exceptions import BlockLimitException
 from random import Random
-from board import Shape
+from board import Block, Shape
+from placement import column_tops
+
+# Shapes an adversary can choose from; bombs are up to the player.
+SHAPES = tuple(Shape)[:-1]
 
 
 class Adversary:
@@ -22,4 +27,106 @@ class RandomAdversary(Adversary):
                 raise BlockLimitException()
             else:
                 self.blocks -= 1
-        return self.random.choice(list(Shape)[:-1])
+        return self.random.choice(SHAPES)
+
+
+class LookaheadAdversary(Adversary):
+    """
+    Lets another adversary choose blocks ahead of time, so that upcoming
+    shapes can be known in advance. The sequence of shapes is unchanged.
+    """
+
+    adversary = None
+    upcoming = None
+
+    def __init__(self, adversary):
+        self.adversary = adversary
+        self.upcoming = deque()
+
+    def fill(self, count, board=None):
+        """
+        Chooses up to count more blocks ahead, returning their shapes. Fewer
+        are returned once the adversary runs out of blocks.
+        """
+
+        shapes = []
+        try:
+            for _ in range(count):
+                shapes.append(self.adversary.choose_block(board))
+        except BlockLimitException:
+            pass
+        self.upcoming.extend(shapes)
+        return shapes
+
+    def choose_block(self, board):
+        if not self.upcoming and not self.fill(1, board):
+            raise BlockLimitException()
+        return self.upcoming.popleft()
+
+
+class WorstCaseAdversary(Adversary):
+    """
+    Chooses the shape the player can do the least with. The block still
+    falling is first landed where the player's drop search would put it;
+    then every shape is placed in turn on the board that leaves, and the
+    one whose best placement scores lowest is chosen. Shapes that would end
+    the game straight away are avoided, so that games last long enough to
+    measure. This drives the board into high, holey positions, which makes
+    it a stress test for the player rather than a fair game.
+
+    The player must have a drop search, like myPlayer's scored_placements.
+    """
+
+    player = None
+    blocks = None
+
+    def __init__(self, player, blocks=None):
+        self.player = player
+        self.blocks = blocks
+
+    def best_placement(self, board):
+        scored = self.player.scored_placements(board, column_tops(board))
+        if not scored:
+            return None
+        return max(scored, key=lambda candidate: candidate[0])
+
+    def land_falling(self, board):
+        """
+        Returns a copy of the board with the falling block landed where the
+        player would most likely put it.
+        """
+
+        board = board.clone()
+        board.next = None
+        if board.falling is not None:
+            best = self.best_placement(board)
+            if best is None:
+                board.falling = None
+            else:
+                score, moves, placement = best
+                board.falling.cells = set(placement.cells)
+                board.land_block()
+        return board
+
+    def best_score(self, board, shape):
+        board = board.clone()
+        board.falling = Block(shape)
+        board.falling.initialize(board)
+        if board.falling.collides(board):
+            # The shape would end the game straight away.
+            return float('inf')
+        best = self.best_placement(board)
+        if best is None:
+            return float('inf')
+        return best[0]
+
+    def choose_block(self, board):
+        if self.blocks is not None:
+            if self.blocks == 0:
+                raise BlockLimitException()
+            else:
+                self.blocks -= 1
+        board = self.land_falling(board)
+        # Ties go to the earliest shape. If every shape ends the game, the
+        # first one does.
+        return min(SHAPES, key=lambda shape: self.best_score(board, shape))
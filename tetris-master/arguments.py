@@ -1,5 +1,7 @@
 import argparse
 
+from constants import BOARD_HEIGHT, BOARD_WIDTH, SAVE_INTERVAL
+
 parser = argparse.ArgumentParser(description='Play Tetris')
 parser.add_argument(
     '--manual',
@@ -8,3 +10,46 @@ parser.add_argument(
     action='store_true',
     help='Play manually'
 )
+parser.add_argument(
+    '--record',
+    metavar='ARCHIVE',
+    default=None,
+    help='Record the game to a replay archive'
+)
+parser.add_argument(
+    '--speed',
+    choices=['1', '10', 'max'],
+    default='1',
+    help='Speed to watch the game at; keys 1, 2 and 3 change it while '
+         'playing'
+)
+parser.add_argument(
+    '--checkpoint',
+    metavar='FILE',
+    default=None,
+    help='Save the game to a checkpoint file as it is played'
+)
+parser.add_argument(
+    '--checkpoint-interval',
+    type=int,
+    default=SAVE_INTERVAL,
+    help='Number of blocks between checkpoints'
+)
+parser.add_argument(
+    '--resume',
+    metavar='FILE',
+    default=None,
+    help='Continue the game saved in a checkpoint file'
+)
+parser.add_argument(
+    '--width',
+    type=int,
+    default=BOARD_WIDTH,
+    help='Number of columns of the board'
+)
+parser.add_argument(
+    '--height',
+    type=int,
+    default=BOARD_HEIGHT,
+    help='Number of rows of the board'
+)
@@ -0,0 +1,103 @@
+import sys
+from time import perf_counter
+
+from adversary import Adversary, RandomAdversary, WorstCaseAdversary
+from board import Board
+from constants import BOARD_HEIGHT, BOARD_WIDTH
+from exceptions import BlockLimitException
+from player import Player, SelectedPlayer
+
+BLOCKS = 200
+# Blocks dealt at random before the worst-case adversary takes over, so
+# that its games, which end quickly, start from different boards.
+OPENING = 10
+
+
+class TimedPlayer(Player):
+    """
+    Plays like the given player, timing every decision.
+    """
+
+    def __init__(self, player):
+        self.player = player
+        self.latencies = []
+
+    def choose_action(self, board):
+        start = perf_counter()
+        actions = self.player.choose_action(board)
+        self.latencies.append(perf_counter() - start)
+        return actions
+
+
+class OpeningAdversary(Adversary):
+    """
+    Deals the first `count` blocks with one adversary and the rest with
+    another.
+    """
+
+    def __init__(self, opening, count, adversary):
+        self.opening = opening
+        self.count = count
+        self.adversary = adversary
+
+    def choose_block(self, board):
+        if self.count > 0:
+            self.count -= 1
+            return self.opening.choose_block(board)
+        return self.adversary.choose_block(board)
+
+
+def play(adversary, player):
+    board = Board(BOARD_WIDTH, BOARD_HEIGHT)
+    try:
+        for move in board.run(player, adversary):
+            pass
+    except BlockLimitException:
+        pass
+    return board.score
+
+
+def report(name, games, scores, latencies):
+    latencies = sorted(latencies)
+    mean = sum(latencies) / len(latencies)
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f'{name:>10} {games:>5} {len(latencies):>9} '
+          f'{sum(scores) // len(scores):>6} {mean*1e3:>8.2f} '
+          f'{p99*1e3:>8.2f} {latencies[-1]*1e3:>8.2f}')
+
+
+def bench_random(blocks):
+    player = TimedPlayer(SelectedPlayer())
+    score = play(RandomAdversary(0, blocks), player)
+    report('random', 1, [score], player.latencies)
+
+
+def bench_worst(blocks):
+    """
+    Plays worst-case games, each after a different random opening, until at
+    least `blocks` decisions against the worst-case adversary have been
+    timed.
+    """
+
+    latencies = []
+    scores = []
+    seed = 0
+    while len(latencies) < blocks:
+        player = TimedPlayer(SelectedPlayer())
+        adversary = OpeningAdversary(
+            RandomAdversary(seed), OPENING,
+            WorstCaseAdversary(SelectedPlayer(), blocks))
+        scores.append(play(adversary, player))
+        # The first decisions place the blocks of the opening.
+        latencies += player.latencies[OPENING:]
+        seed += 1
+    report('worst', len(scores), scores, latencies)
+
+
+if __name__ == '__main__':
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else BLOCKS
+
+    print(f'{"adversary":>10} {"games":>5} {"decisions":>9} {"score":>6} '
+          f'{"mean ms":>8} {"p99 ms":>8} {"max ms":>8}')
+    bench_random(blocks)
+    bench_worst(blocks)
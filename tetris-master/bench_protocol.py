@@ -0,0 +1,130 @@
+import os
+import subprocess
+import sys
+from time import perf_counter
+
+from board import Action, Direction, Rotation
+from constants import PREFIX
+from exceptions import UnknownInstructionException
+from protocol import Channel, format_action, parse_action
+from shm import ShmChannel
+
+SHM_NAME = f'tetris-bench-{os.getpid()}'
+
+TURNS = 20000
+# A typical placement: rotate, shift and drop.
+TURN = [Rotation.Clockwise, Direction.Left, Direction.Left, Direction.Left,
+        Direction.Left, Direction.Drop]
+
+
+def legacy_parse(instruction):
+    """
+    The way client.py used to parse instructions.
+    """
+
+    if instruction == 'SKIP':
+        return None
+
+    try:
+        return Direction(instruction)
+    except ValueError:
+        pass
+
+    try:
+        return Rotation(instruction)
+    except ValueError:
+        pass
+
+    try:
+        return Action(instruction)
+    except ValueError:
+        pass
+
+    raise UnknownInstructionException
+
+
+def legacy_game():
+    """
+    Reads actions line by line with input() and answers every turn with a
+    shape, printing and flushing every message.
+    """
+
+    while True:
+        for _ in TURN:
+            try:
+                instruction = input().strip()
+            except EOFError:
+                return
+            legacy_parse(instruction[len(PREFIX)+1:])
+        print(f'{PREFIX} I', flush=True)
+
+
+def buffered_game(channel):
+    while True:
+        for _ in TURN:
+            instruction = channel.receive()
+            if instruction is None:
+                return
+            parse_action(instruction)
+        channel.send('I')
+
+
+def legacy_player(game):
+    lines = [f'{PREFIX} {format_action(action)}\n'.encode()
+             for action in TURN]
+    for _ in range(TURNS):
+        for line in lines:
+            game.stdin.write(line)
+            game.stdin.flush()
+        game.stdout.readline()
+
+
+def buffered_player(channel):
+    for _ in range(TURNS):
+        for action in TURN:
+            channel.send(format_action(action))
+        channel.receive()
+
+
+def bench(mode):
+    name = SHM_NAME
+    game = subprocess.Popen([sys.executable, __file__, mode, name],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    if mode == 'shm':
+        channel = ShmChannel(name, game=False)
+    else:
+        channel = Channel(game.stdout, game.stdin)
+
+    start = perf_counter()
+    if mode == 'legacy':
+        legacy_player(game)
+    else:
+        buffered_player(channel)
+    elapsed = perf_counter() - start
+
+    if mode == 'shm':
+        channel.close()
+    game.stdin.close()
+    game.wait()
+
+    messages = TURNS * (len(TURN) + 1)
+    print(f'{mode:>8}: {messages/elapsed:>9.0f} messages/s, '
+          f'{elapsed/TURNS*1e6:.1f} us/turn')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        if sys.argv[1] == 'legacy':
+            legacy_game()
+        elif sys.argv[1] == 'shm':
+            channel = ShmChannel(sys.argv[2], game=True)
+            try:
+                buffered_game(channel)
+            finally:
+                channel.close()
+        else:
+            buffered_game(Channel())
+    else:
+        bench('legacy')
+        bench('buffered')
+        bench('shm')
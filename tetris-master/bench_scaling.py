@@ -0,0 +1,56 @@
+import sys
+from time import perf_counter
+
+from adversary import RandomAdversary
+from board import Board, Direction
+from exceptions import BlockLimitException
+from player import Player
+
+SIZES = [(10, 24), (10, 100), (10, 1000), (64, 24), (64, 1000)]
+BLOCKS = 300
+
+
+class StackingPlayer(Player):
+    """
+    A trivial player that drops each block into the next column in turn, so
+    that the time per move measures the engine rather than the player.
+    """
+
+    column = 0
+
+    def choose_action(self, board):
+        if board.falling.left < self.column:
+            return Direction.Right
+        elif board.falling.left > self.column:
+            return Direction.Left
+
+        self.column = (self.column + 4) % (board.width - 3)
+        return Direction.Drop
+
+
+def bench(width, height):
+    board = Board(width, height)
+    adversary = RandomAdversary(0, BLOCKS)
+    moves = 0
+
+    start = perf_counter()
+    try:
+        for move in board.run(StackingPlayer(), adversary):
+            moves += 1
+    except BlockLimitException:
+        pass
+    elapsed = perf_counter() - start
+
+    return moves, len(board.cells), elapsed
+
+
+if __name__ == '__main__':
+    sizes = SIZES
+    if len(sys.argv) > 1:
+        sizes = [tuple(map(int, size.split('x'))) for size in sys.argv[1:]]
+
+    print(f'{"board":>10} {"moves":>8} {"cells":>6} {"us/move":>8}')
+    for width, height in sizes:
+        moves, cells, elapsed = bench(width, height)
+        print(f'{width:>4}x{height:<5} {moves:>8} {cells:>6} '
+              f'{elapsed/moves*1e6:>8.1f}')
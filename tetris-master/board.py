@@ -1,7 +1,10 @@
+from bisect import bisect_right
 from enum import Enum
 from threading import Lock
+from events import BlockSpawned, BlockMoved, BlockLanded, RowsCleared, \
+    BombExploded, NextChanged, ScoreChanged, CountersChanged
 from exceptions import NoBlockException
-from types import GeneratorType
+from types import GeneratorType, MappingProxyType
 
 class Action(Enum):
     Bomb = 'BOMB'
@@ -244,10 +247,42 @@ class Block(Bitmap):
             return False
 
         elif direction == Direction.Drop:
-            while not self.supported(board):
-                self.move(Direction.Down, board)
+            distance = self.drop_distance(board)
+            if distance > 0:
+                self.cells = {(x, y+distance) for (x, y) in self}
+                # Score a point for every row a block drops.
+                board.score += distance
+                self.center = self.center[0], self.center[1]+distance
             return True
 
+    def drop_distance(self, board):
+        """
+        Returns the number of rows the block can move down before it is
+        supported. Costs whichever is smaller of a scan over the rows below
+        the block and a scan over the cells on the board.
+        """
+
+        # Lowest cell of the block in each of its columns.
+        bottoms = {}
+        for (x, y) in self:
+            if y > bottoms.get(x, -1):
+                bottoms[x] = y
+
+        floors = dict.fromkeys(bottoms, board.height)
+        rows = board.height - min(bottoms.values())
+        if len(board.cells) < rows * len(bottoms):
+            for (x, y) in board.cells:
+                if x in floors and bottoms[x] < y < floors[x]:
+                    floors[x] = y
+        else:
+            for x, bottom in bottoms.items():
+                y = bottom + 1
+                while y < board.height and (x, y) not in board:
+                    y += 1
+                floors[x] = y
+
+        return min(floors[x] - bottoms[x] - 1 for x in bottoms)
+
     def rotate(self, rotation, board):
         """
         Rotates block in the given direction on the board. Returns true if this
@@ -310,6 +345,46 @@ class Block(Bitmap):
         return block
 
 
+class Snapshot:
+    """
+    An immutable copy of the state of a board that other threads, such as
+    renderers, can read without taking the board's lock. Has the same
+    attributes as the board it was taken from, except cells, along with the
+    version of the cells and the version each row last changed in, so that
+    renderers can tell which rows to redraw.
+    """
+
+    def __init__(self, board, cellcolor):
+        self.width = board.width
+        self.height = board.height
+        self.score = board.score
+        self.bombs_remaining = board.bombs_remaining
+        self.discards_remaining = board.discards_remaining
+        self.cellcolor = cellcolor
+        self.cells_version = board.cells_version
+        self.row_versions = board.row_versions
+
+        # Blocks are only ever changed by the board they belong to; these
+        # copies are not.
+        self.falling = None
+        if board.falling is not None:
+            self.falling = board.falling.clone()
+        self.next = None
+        if board.next is not None:
+            self.next = board.next.clone()
+
+    def changed_rows(self, version):
+        """
+        Returns the rows whose cells changed since the given version of the
+        cells.
+        """
+
+        if version == self.cells_version:
+            return []
+        return [y for y, changed in enumerate(self.row_versions)
+                if changed > version]
+
+
 class Board(Bitmap):
     """
     Class that keeps track of occupied cells and the current falling block,
@@ -329,6 +404,19 @@ class Board(Bitmap):
     bombs_remaining = None
     discards_remaining = None
 
+    # Whether a Snapshot is published after every change, and the latest.
+    snapshots = False
+    snapshot = None
+    # Read-only copy of the cell colours, shared by snapshots until cells
+    # change.
+    snapshot_colors = None
+    # Counts the changes to the cells while snapshots are published, and
+    # the count each row last changed at, as a tuple shared by snapshots.
+    cells_version = 0
+    row_versions = None
+    # Functions called with every change to the board, if any.
+    listeners = None
+
     def __init__(self, width, height, score=0,
                  discards_remaining=10, bombs_remaining=5):
         self.width = width
@@ -342,9 +430,9 @@ class Board(Bitmap):
 
     def __str__(self):
         s = ("--------")
-        for y in range(24):
+        for y in range(self.height):
             s += "\n"
-            for x in range(10):
+            for x in range(self.width):
                 if (x,y) in self.cells:
                     s += "#"
                 else:
@@ -373,31 +461,60 @@ class Board(Bitmap):
             for (x, y) in self if y != line
         }
 
-    def clean(self):
+    def remove_lines(self, lines):
         """
-        Cleans all fully occupied lines from the bottom down, and moves lines
-        above the cleaned lines down as well.
+        Removes all blocks on the given lines, sorted from the top down, and
+        moves down all blocks above them in a single pass.
+        """
+
+        def shift(y):
+            # Every removed line below y moves it down by one.
+            return y + len(lines) - bisect_right(lines, y)
+
+        self.cellcolor = {
+            (x, shift(y)): c
+            for (x, y), c in self.cellcolor.items() if y not in lines
+        }
+        self.cells = {
+            (x, shift(y)) for (x, y) in self if y not in lines
+        }
+
+    def clean(self, lines=None):
+        """
+        Cleans all fully occupied lines, and moves lines above the cleaned
+        lines down as well. If lines are given, only those are checked; a
+        landed block can only complete the lines it occupies.
         """
 
         scores = [0, 25, 100, 400, 1600]
-        removed = 0
 
-        line = self.height-1
-        while line > 0:
-            while self.line_full(line):
-                self.remove_line(line)
-                removed += 1
-            line -= 1
+        if lines is None:
+            lines = range(self.height)
+        # The top line is never cleaned.
+        full = sorted(line for line in set(lines)
+                      if line > 0 and self.line_full(line))
+        if full:
+            self.remove_lines(full)
+            if self.listeners:
+                self.emit(RowsCleared(tuple(full)))
 
-        return scores[removed]
+        return scores[len(full)]
 
     def explode(self, pos):
+        """
+        Removes the cells around a bomb and lets the cells above fall.
+        Returns the cells removed, and the cells moved as (from, to) pairs.
+        """
+
         bx,by = next(iter(pos))
+        old_cellcolor = self.cellcolor
+        shifted = []
 
         # remove the cells exploded by the bomb
         self.cellcolor = {
             (x, y): c for (x, y), c in self.cellcolor.items() if (abs(bx - x) > 1 or abs(by - y) > 1)
         }
+        removed = frozenset(old_cellcolor.keys() - self.cellcolor.keys())
         # populate cells from cellcolor
         self.cells = {
             (x, y) for (x, y), c in self.cellcolor.items()
@@ -405,8 +522,8 @@ class Board(Bitmap):
 
         # shift anything above downwards
         for xi in range(bx-1,bx+2):
-            lowest = 24
-            for yi in range(by, 24):
+            lowest = self.height
+            for yi in range(by, self.height):
                 if (xi, yi) in self:
                     lowest = yi
                     break
@@ -418,6 +535,8 @@ class Board(Bitmap):
                     self.cellcolor.pop((xi,yi))
                     self.cells.add((xi,lowest))
                     self.cellcolor[(xi,lowest)] = c
+                    if yi != lowest:
+                        shifted.append(((xi, yi), (xi, lowest)))
                     lowest -= 1
         
         #self.cellcolor[bx,by] = 'yellow'
@@ -428,6 +547,69 @@ class Board(Bitmap):
         #    (x, y) for (x, y) in self if (abs(bx - x) > 1 and abs(by - y) > 1) or (bx == x and by == y)
         #}
 
+        return removed, shifted
+
+    def subscribe(self, listener):
+        """
+        Calls listener with every change to the board, as one of the events
+        in events.py. Clones do not inherit listeners, and a board without
+        any does no work for them.
+        """
+
+        # Replace rather than change the list, in case it is being emitted
+        # to.
+        self.listeners = (self.listeners or []) + [listener]
+
+    def unsubscribe(self, listener):
+        listeners = [other for other in self.listeners
+                     if other is not listener]
+        self.listeners = listeners or None
+
+    def emit(self, event):
+        for listener in self.listeners:
+            listener(event)
+
+    def report_action(self, cells, score, landed):
+        """
+        Emits the events of a player action that were not emitted along the
+        way, given the cells of the falling block and the score before it.
+        """
+
+        if not landed and self.falling is not None \
+           and self.falling.cells is not cells:
+            self.emit(BlockMoved(frozenset(self.falling.cells)))
+        if self.score != score:
+            self.emit(ScoreChanged(self.score))
+
+    def enable_snapshots(self):
+        """
+        Makes the board publish a Snapshot of itself in the snapshot
+        attribute after every change. Boards do not by default, and clones
+        never do.
+        """
+
+        with self.lock:
+            self.snapshots = True
+            self.row_versions = (0,) * self.height
+            self.publish()
+
+    def rows_changed(self, rows):
+        """
+        Records that the cells of the given rows changed, for the snapshots
+        to come.
+        """
+
+        self.cells_version += 1
+        versions = list(self.row_versions)
+        for y in rows:
+            versions[y] = self.cells_version
+        self.row_versions = tuple(versions)
+
+    def publish(self):
+        if self.snapshot_colors is None:
+            self.snapshot_colors = MappingProxyType(self.cellcolor.copy())
+        self.snapshot = Snapshot(self, self.snapshot_colors)
+
     @property
     def alive(self):
         """
@@ -445,6 +627,9 @@ class Board(Bitmap):
         # Place the next block, if it exists.
         if self.falling is not None:
             self.falling.initialize(self)
+            if self.listeners:
+                self.emit(BlockSpawned(self.falling.shape,
+                                       frozenset(self.falling.cells)))
 
         self.next = None
 
@@ -456,6 +641,11 @@ class Board(Bitmap):
 
         # Ask the adversary for a new next block.
         self.next = Block(adversary.choose_block(self))
+        if self.listeners:
+            self.emit(NextChanged(self.next.shape))
+        if self.snapshots:
+            with self.lock:
+                self.publish()
         return self.next.shape
 
     def do_action(self, fn, clone, action=None):
@@ -490,16 +680,7 @@ class Board(Bitmap):
 
             landed = False
             for action in actions:
-                if action is None:
-                    fn = Board.skip
-                elif action is Action.Bomb:
-                    fn = Board.bomb
-                elif action is Action.Discard:
-                    fn = Board.discard
-                elif isinstance(action, Direction):
-                    fn = Board.move
-                elif isinstance(action, Rotation):
-                    fn = Board.rotate
+                fn = action_function(action)
                 landed = self.do_action(fn, clone, action)
 
                 yield action
@@ -520,11 +701,23 @@ class Board(Bitmap):
 
         # Place this block on the board
         self.place_next_block()
+        if self.snapshots:
+            with self.lock:
+                self.publish()
 
-        while True:
-            # The adversary can now choose a new next block.
-            yield self.run_adversary(adversary)
+        # The adversary can now choose a new next block.
+        yield self.run_adversary(adversary)
 
+        yield from self.resume(player, adversary)
+
+    def resume(self, player, adversary):
+        """
+        Continues a game from the start of a turn, once the falling and next
+        blocks have been chosen; for instance on a board restored from a
+        checkpoint. Yields moves like run does.
+        """
+
+        while True:
             # The block may have caused the end of the game.
             if not self.alive:
                 return
@@ -532,19 +725,48 @@ class Board(Bitmap):
             # Ask the player for the next move(s) to make.
             yield from self.run_player(player)
 
+            # The adversary can now choose a new next block.
+            yield self.run_adversary(adversary)
+
     def land_block(self):
         # A bomb landed
         if self.falling.shape == Shape.B:
-            self.explode(self.falling.cells)
+            removed, shifted = self.explode(self.falling.cells)
+            # The lowest row a cell was removed from or fell to.
+            lowest = max([y for (x, y) in removed] +
+                         [y for _, (x, y) in shifted], default=0)
+            if self.listeners:
+                self.emit(BombExploded(next(iter(self.falling)), removed,
+                                       tuple(shifted)))
+            # Cells may have shifted into any line.
+            lines = None
         else:
             # A fallen block becomes part of the cells on the board.
             self.cells |= self.falling.cells
             for pos in self.falling.cells:
                 self.cellcolor[pos] = self.falling.color
+            lines = [y for (x, y) in self.falling]
+            if self.listeners:
+                self.emit(BlockLanded(self.falling.shape, self.falling.color,
+                                      frozenset(self.falling.cells)))
         self.falling = None
+        self.snapshot_colors = None
 
         # Clean up any completed rows and adjust score.
-        self.score += self.clean()
+        points = self.clean(lines)
+        self.score += points
+
+        if self.snapshots:
+            if points:
+                # Every row down to the lowest one removed has moved.
+                rows = range(self.height if lines is None else max(lines) + 1)
+            elif lines is None:
+                # Cells may have fallen from anywhere above the bomb down
+                # to the stack below it.
+                rows = range(lowest + 1)
+            else:
+                rows = lines
+            self.rows_changed(rows)
 
         self.place_next_block()
 
@@ -559,16 +781,19 @@ class Board(Bitmap):
             raise NoBlockException
 
         with self.lock:
-            if self.falling.move(direction, self):
-                self.land_block()
-                return True
+            cells, score = self.falling.cells, self.score
 
-            # Block has not fallen yet; apply the implicit move down.
-            if self.falling.move(Direction.Down, self):
+            # If the block has not fallen yet, apply the implicit move down.
+            landed = self.falling.move(direction, self) \
+                or self.falling.move(Direction.Down, self)
+            if landed:
                 self.land_block()
-                return True
-            else:
-                return False
+
+            if self.listeners:
+                self.report_action(cells, score, landed)
+            if self.snapshots:
+                self.publish()
+            return landed
 
     def rotate(self, rotation):
         """
@@ -581,14 +806,19 @@ class Board(Bitmap):
             raise NoBlockException
 
         with self.lock:
+            cells, score = self.falling.cells, self.score
             self.falling.rotate(rotation, self)
 
             # Apply the implicit move down.
-            if self.falling.move(Direction.Down, self):
+            landed = self.falling.move(Direction.Down, self)
+            if landed:
                 self.land_block()
-                return True
-            else:
-                return False
+
+            if self.listeners:
+                self.report_action(cells, score, landed)
+            if self.snapshots:
+                self.publish()
+            return landed
 
     def bomb(self, action=None):
         """
@@ -601,6 +831,10 @@ class Board(Bitmap):
            and self.next.shape is not Shape.B:
             self.next = Block(Shape.B)
             self.bombs_remaining -= 1
+            if self.listeners:
+                self.emit(NextChanged(Shape.B))
+                self.emit(CountersChanged(self.bombs_remaining,
+                                          self.discards_remaining))
         return self.skip()
 
     def discard(self, action=None):
@@ -618,7 +852,12 @@ class Board(Bitmap):
         with self.lock:
             if self.discards_remaining > 0:
                 self.discards_remaining -= 1
+                if self.listeners:
+                    self.emit(CountersChanged(self.bombs_remaining,
+                                              self.discards_remaining))
                 self.place_next_block()
+                if self.snapshots:
+                    self.publish()
                 return True
             return False
 
@@ -631,9 +870,17 @@ class Board(Bitmap):
             raise NoBlockException
 
         with self.lock:
+            cells, score = self.falling.cells, self.score
+
             res = self.falling.move(Direction.Down, self)
             if res:
                 self.land_block()
+
+            if self.listeners:
+                self.report_action(cells, score, res)
+
+            if self.snapshots:
+                self.publish()
             return res
 
     def clone(self):
@@ -655,3 +902,20 @@ class Board(Bitmap):
             board.next = self.next.clone()
 
         return board
+
+
+def action_function(action):
+    """
+    Returns the Board method that performs the given player action.
+    """
+
+    if action is None:
+        return Board.skip
+    elif action is Action.Bomb:
+        return Board.bomb
+    elif action is Action.Discard:
+        return Board.discard
+    elif isinstance(action, Direction):
+        return Board.move
+    elif isinstance(action, Rotation):
+        return Board.rotate
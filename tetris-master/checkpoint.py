@@ -0,0 +1,156 @@
+import os
+import struct
+from threading import Condition, Thread
+
+from board import Board, Shape
+from constants import SAVE_INTERVAL
+from replay import encode_board, decode_board
+
+MAGIC = b'TCKP'
+VERSION = 1
+
+# The adversary's block counter (-1 when unlimited) and the state of its
+# Mersenne Twister: 624 words and the position within them, plus a cached
+# gaussian, if any.
+HEADER = struct.Struct('<4sHq')
+RANDOM_STATE = struct.Struct('<B625I?d')
+
+
+def encode_checkpoint(board, adversary):
+    """
+    Serializes a game between turns: the board along with the state of the
+    RandomAdversary choosing its blocks.
+    """
+
+    version, words, gauss = adversary.random.getstate()
+    blocks = -1 if adversary.blocks is None else adversary.blocks
+    return b''.join([
+        HEADER.pack(MAGIC, VERSION, blocks),
+        RANDOM_STATE.pack(version, *words, gauss is not None, gauss or 0),
+        encode_board(board),
+    ])
+
+
+def decode_checkpoint(data, adversary=None):
+    """
+    Rebuilds the board saved by encode_checkpoint. The state of the
+    adversary, which must be a RandomAdversary, is restored too if one is
+    given; a remote player only needs the board.
+    """
+
+    magic, version, blocks = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('not a checkpoint')
+
+    if adversary is not None:
+        state = RANDOM_STATE.unpack_from(data, HEADER.size)
+        gauss = state[-1] if state[-2] else None
+        adversary.random.setstate((state[0], tuple(state[1:-2]), gauss))
+        adversary.blocks = None if blocks < 0 else blocks
+
+    return decode_board(data, HEADER.size + RANDOM_STATE.size)
+
+
+def load(path, adversary=None):
+    with open(path, 'rb') as f:
+        return decode_checkpoint(f.read(), adversary)
+
+
+def write_atomically(path, data):
+    """
+    Replaces the file at path with data, so that a crash leaves either the
+    old or the new file behind, never a partial one.
+    """
+
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+class Checkpointer:
+    """
+    Saves a game every `interval` blocks. The game is encoded in place, which
+    only takes a few microseconds, and written to disk by a background
+    thread. If the disk falls behind, only the latest checkpoint is kept.
+    """
+
+    def __init__(self, path, interval=SAVE_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.blocks = 0
+        self.pending = None
+        self.closed = False
+        self.condition = Condition()
+        self.thread = Thread(target=self.write, daemon=True)
+        self.thread.start()
+
+    def watch(self, moves, board, adversary):
+        """
+        Passes through the moves yielded by Board.run or Board.resume,
+        saving the game at the start of every `interval`-th turn.
+        """
+
+        try:
+            for move in moves:
+                # A new shape with a block already falling starts a turn,
+                # which is where Board.resume picks the game up again.
+                if isinstance(move, Shape) and board.falling is not None:
+                    self.blocks += 1
+                    if self.blocks % self.interval == 0:
+                        self.save(board, adversary)
+                yield move
+        finally:
+            self.close()
+
+    def save(self, board, adversary):
+        data = encode_checkpoint(board, adversary)
+        with self.condition:
+            self.pending = data
+            self.condition.notify()
+
+    def write(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                data, self.pending = self.pending, None
+            if data is None:
+                return
+            write_atomically(self.path, data)
+
+    def close(self):
+        """
+        Waits for the last checkpoint to be written.
+        """
+
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+
+
+def start_game(args, player, adversary):
+    """
+    Sets up a game for the front ends from their command line arguments:
+    resumed from a checkpoint and saving checkpoints as asked. Returns the
+    board and the moves of the game.
+    """
+
+    if args.resume:
+        board = load(args.resume, adversary)
+        if (board.width, board.height) != (args.width, args.height):
+            raise SystemExit(f'{args.resume} holds a {board.width}x'
+                             f'{board.height} board')
+        moves = board.resume(player, adversary)
+    else:
+        board = Board(args.width, args.height)
+        moves = board.run(player, adversary)
+
+    if args.checkpoint:
+        checkpointer = Checkpointer(args.checkpoint, args.checkpoint_interval)
+        moves = checkpointer.watch(moves, board, adversary)
+
+    return board, moves
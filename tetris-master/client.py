@@ -1,65 +1,113 @@
-from adversary import RandomAdversary
-from board import Board, Direction, Rotation, Action, Shape
-from constants import BOARD_HEIGHT, BOARD_WIDTH, BLOCK_LIMIT, PREFIX
+from adversary import Adversary, LookaheadAdversary, RandomAdversary
+from board import Board
+from checkpoint import Checkpointer, load
+from constants import BOARD_HEIGHT, BOARD_WIDTH, BLOCK_LIMIT, SAVE_INTERVAL
 from exceptions import UnknownInstructionException, BlockLimitException
 from player import Player
+from protocol import HELLO, PREVIEW, EXTENSIONS, Channel, \
+    extension_options, hello_reply, parse_actions
 
 from sys import stderr
 from os import getenv
 
 
-class RemotePlayer(Player):
-    def choose_action(self, board):
-        while True:
-            try:
-                instruction = input().strip()
-            except EOFError:
-                raise UnknownInstructionException
-
-            if instruction.startswith(PREFIX):
-                break
-
-        instruction = instruction[len(PREFIX)+1:]
+class AnnouncingAdversary(Adversary):
+    """
+    Chooses blocks with the given adversary and tells the player about them:
+    one shape per turn, or in PREVIEW mode several shapes at a time.
+    """
 
-        if instruction == 'SKIP':
-            return None
+    preview = 0
 
-        try:
-            return Direction(instruction)
-        except ValueError:
-            pass
+    def __init__(self, adversary, channel):
+        self.lookahead = LookaheadAdversary(adversary)
+        self.channel = channel
 
-        try:
-            return Rotation(instruction)
-        except ValueError:
-            pass
+    def choose_block(self, board):
+        if not self.lookahead.upcoming:
+            if self.preview:
+                shapes = self.lookahead.fill(self.preview, board)
+                if shapes:
+                    self.channel.send(
+                        PREVIEW + ''.join(f' {shape.value}' for shape in shapes))
+            else:
+                for shape in self.lookahead.fill(1, board):
+                    self.channel.send(shape.value)
 
-        try:
-            return Action(instruction)
-        except ValueError:
-            pass
+        return self.lookahead.choose_block(board)
 
-        raise UnknownInstructionException
 
+class RemotePlayer(Player):
+    # Protocol extensions offered to the player.
+    supported = EXTENSIONS
 
-board = Board(BOARD_WIDTH, BOARD_HEIGHT)
-
-player = RemotePlayer()
-adversary = RandomAdversary(getenv('SEED'), BLOCK_LIMIT)
-
+    def __init__(self, channel, adversary):
+        self.channel = channel
+        self.adversary = adversary
 
-score = 0
-try:
-    for move in board.run(player, adversary):
-        if isinstance(move, Shape):
-            print(f'{PREFIX} {move.value}')
+    def choose_action(self, board):
+        while True:
+            # Sends the shapes of this turn before waiting for the player.
+            instruction = self.channel.receive()
+            if instruction is None:
+                raise UnknownInstructionException
 
-        if board.score != score:
-            stderr.write(f'{board.score}\n')
-            score = board.score
-except BlockLimitException:
-    stderr.write('WON\n')
-    print(f'{PREFIX} WON')
-else:
-    stderr.write('LOST\n')
-    print(f'{PREFIX} LOST')
+            if instruction.startswith(HELLO):
+                # Agree to the extensions we support, and keep waiting for
+                # the actual move.
+                reply = hello_reply(instruction, self.supported)
+                self.channel.send(reply)
+
+                # The count of an agreed PREVIEW has been checked.
+                preview = extension_options(reply).get(PREVIEW)
+                if preview:
+                    self.adversary.preview = int(preview)
+                continue
+
+            return parse_actions(instruction)
+
+
+def main():
+    if getenv('SHM'):
+        # Talk to a player on the same host through shared memory.
+        from shm import ShmChannel
+        channel = ShmChannel(getenv('SHM'), game=True)
+    else:
+        channel = Channel()
+    random_adversary = RandomAdversary(getenv('SEED'), BLOCK_LIMIT)
+    adversary = AnnouncingAdversary(random_adversary, channel)
+    player = RemotePlayer(channel, adversary)
+
+    if getenv('RESUME'):
+        # Continue a saved game; the player resumes from the same checkpoint.
+        board = load(getenv('RESUME'), random_adversary)
+        moves = board.resume(player, adversary)
+    else:
+        board = Board(BOARD_WIDTH, BOARD_HEIGHT)
+        moves = board.run(player, adversary)
+
+    if getenv('CHECKPOINT'):
+        interval = int(getenv('CHECKPOINT_INTERVAL', SAVE_INTERVAL))
+        checkpointer = Checkpointer(getenv('CHECKPOINT'), interval)
+        moves = checkpointer.watch(moves, board, random_adversary)
+        # Shapes announced ahead of time would be lost on resuming.
+        player.supported = EXTENSIONS - {PREVIEW}
+
+    score = board.score
+    try:
+        for move in moves:
+            if board.score != score:
+                stderr.write(f'{board.score}\n')
+                score = board.score
+    except BlockLimitException:
+        stderr.write('WON\n')
+        channel.send('WON')
+    else:
+        stderr.write('LOST\n')
+        channel.send('LOST')
+    finally:
+        channel.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,21 @@
 from adversary import RandomAdversary
 from arguments import parser
-from board import Board, Direction, Rotation, Action
-from constants import BOARD_WIDTH, BOARD_HEIGHT, DEFAULT_SEED, INTERVAL,\
-    BLOCK_LIMIT
+from board import Direction, Rotation, Action
+from checkpoint import start_game
+from constants import DEFAULT_SEED, INTERVAL, BLOCK_LIMIT
 from exceptions import BlockLimitException
+from pacing import Pacer, Simulation, SPEED_NAMES
 from player import SelectedPlayer, Player
+from replay import Recorder, ArchiveWriter
 from time import sleep
 
 import curses
 import curses.ascii
 
 
+# Frames drawn per second when the player is not manual.
+FRAMES_PER_SECOND = 20
+
 COLOR_WALL = 1
 COLOR_BLOCK = 2
 COLOR_CELL = 3
@@ -41,101 +46,161 @@ def paint(window, x, y, color, count=1):
     else:
         window.addstr(y, x*2, '  ' * count, curses.color_pair(color))
 
-def render(window, board):
+class Renderer:
     """
-    Write a depiction of the board to standard output.
+    Draws the board in a curses window, keeping track of what is on screen
+    so that every frame only paints what changed. The frame and the labels
+    are drawn once.
     """
 
-    for y in range(board.height):
-        # Draw each individual row
-        for x in range(board.width):
-            if board.falling is not None and (x, y) in board.falling:
-                # Location is occupied by falling block
-                color = COLOR_NAMES[board.falling.color]
-            elif (x, y) in board:
-                # Location is occupied by fallen block
-                color = COLOR_NAMES[board.cellcolor[(x, y)]]
+    def __init__(self, window, board):
+        self.window = window
+        self.board = board
+        board.enable_snapshots()
+        # Colour of every cell currently on screen, the version of the
+        # cells drawn, and the cells of the falling block drawn over them.
+        self.drawn = {}
+        self.cells_version = -1
+        self.falling = ()
+        self.score = None
+        self.next = None
+        self.bombs = None
+        self.discards = None
+        self.draw_static()
+
+    def draw_static(self):
+        window = self.window
+        board = self.board
+
+        for y in range(board.height):
+            paint(window, 1, y, COLOR_NOTHING, board.width)
+        for y in range(3, 9):
+            paint(window, board.width+3, y, COLOR_NOTHING, 4)
+
+        window.addstr(2, (board.width*2)+5, 'NEXT',
+                      curses.color_pair(COLOR_NOTHING))
+        window.addstr(7, (board.width*2)+5, 'BOMBS',
+                      curses.color_pair(COLOR_NOTHING))
+        window.addstr(10, (board.width*2)+5, 'DISCARDS',
+                      curses.color_pair(COLOR_NOTHING))
+
+        # Draw the board frame
+        window.move(0, 0)
+        window.vline(curses.ACS_VLINE, board.height+2)
+        window.move(0, 1)
+        window.vline(curses.ACS_VLINE, board.height+1)
+        window.addch(0, 0, curses.ACS_ULCORNER)
+        window.addch(0, 1, curses.ACS_URCORNER)
+        window.move(0, board.width*2+2)
+        window.vline(curses.ACS_VLINE, board.height+1)
+        window.move(0, board.width*2+3)
+        window.vline(curses.ACS_VLINE, board.height+2)
+        window.addch(0, board.width*2+2, curses.ACS_ULCORNER)
+        window.addch(0, board.width*2+3, curses.ACS_URCORNER)
+        window.move(board.height+1, 0)
+        window.hline(curses.ACS_HLINE, board.width*2+3)
+        window.move(board.height, 1)
+        window.hline(curses.ACS_HLINE, board.width*2+1)
+        window.addch(board.height+1, 0, curses.ACS_LLCORNER)
+        window.addch(board.height, 1, curses.ACS_LLCORNER)
+        window.addch(board.height+1, board.width*2+3, curses.ACS_LRCORNER)
+        window.addch(board.height, board.width*2+2, curses.ACS_LRCORNER)
+
+    def render_cells(self, board):
+        # Only look at the rows that changed since the last frame, and at
+        # where the falling block was and is.
+        cells = set(self.falling)
+        for y in board.changed_rows(self.cells_version):
+            cells.update((x, y) for x in range(board.width))
+        falling = ()
+        if board.falling is not None:
+            falling = board.falling.cells
+            falling_color = COLOR_NAMES[board.falling.color]
+            cells |= falling
+
+        for (x, y) in cells:
+            if (x, y) in falling:
+                color = falling_color
+            elif (x, y) in board.cellcolor:
+                color = COLOR_NAMES[board.cellcolor[x, y]]
             else:
-                # There is nothing here.
                 color = COLOR_NOTHING
-            paint(window, x+1, y, color)
-
-    # Draw the score
-    window.addstr(
-        0,
-        (board.width*2)+5,
-        f'SCORE: {board.score} ',
-        curses.color_pair(COLOR_NOTHING)
-    )
-
-    # Draw the next piece
-    window.addstr(2, (board.width*2)+5, 'NEXT',
-                  curses.color_pair(COLOR_NOTHING))
-    if board.next is not None:
-        for y in range(6):
-            for x in range(4):
-                if (x, y) in board.next:
-                    color = COLOR_NAMES[board.next.color]
+            if self.drawn.get((x, y)) != color:
+                paint(self.window, x+1, y, color)
+                self.drawn[x, y] = color
+        self.cells_version = board.cells_version
+        self.falling = falling
+
+    def render_panel(self, board):
+        window = self.window
+
+        # Draw the score
+        if board.score != self.score:
+            self.score = board.score
+            window.addstr(
+                0,
+                (board.width*2)+5,
+                f'SCORE: {board.score} ',
+                curses.color_pair(COLOR_NOTHING)
+            )
+
+        # Draw the next piece
+        shape = None if board.next is None else board.next.shape
+        if shape != self.next and board.next is not None:
+            self.next = shape
+            # Shapes are at most four cells tall; the bombs are below.
+            for y in range(4):
+                for x in range(4):
+                    if (x, y) in board.next:
+                        color = COLOR_NAMES[board.next.color]
+                    else:
+                        color = COLOR_NOTHING
+
+                    paint(window, board.width+x+3, y+3, color)
+
+        # Draw the bombs
+        if board.bombs_remaining != self.bombs:
+            self.bombs = board.bombs_remaining
+            for bomb in range(1,6):
+                if board.bombs_remaining >= bomb:
+                    s = '<>'
+                    color = COLOR_BOMB
                 else:
+                    s = '  '
                     color = COLOR_NOTHING
+                window.addstr(8, (board.width*2)+5+(bomb-1)*3, s,
+                              curses.color_pair(color))
 
-                paint(window, board.width+x+3, y+3, color)
-
-    # Draw the bombs
-    window.addstr(7, (board.width*2)+5, 'BOMBS',
-                  curses.color_pair(COLOR_NOTHING))
-    for bomb in range(1,6):
-        if board.bombs_remaining >= bomb:
-            s = '<>'
-            color = COLOR_BOMB
-        else:
-            s = '  '
-            color = COLOR_NOTHING
-        window.addstr(8, (board.width*2)+5+(bomb-1)*3, s,
-                      curses.color_pair(color))
-        
-
-    # Draw the Discards
-    window.addstr(10, (board.width*2)+5, 'DISCARDS',
-                  curses.color_pair(COLOR_NOTHING))
-    discards = board.discards_remaining
-    if discards >= 5:
-        s1 = "X X X X X"
-        s2 = (discards - 5)*" X" + (10-discards)*"  "
-    else:
-        s1 = discards*"X " + (5-discards)*"  "
-        s2 = "          "
-    window.addstr(11, (board.width*2)+5, s1,
-                  curses.color_pair(COLOR_DISCARD))
-    window.addstr(12, (board.width*2)+5, s2,
-                  curses.color_pair(COLOR_DISCARD))
-    
-    
-
-    # Draw the board frame
-    window.move(0, 0)
-    window.vline(curses.ACS_VLINE, board.height+2)
-    window.move(0, 1)
-    window.vline(curses.ACS_VLINE, board.height+1)
-    window.addch(0, 0, curses.ACS_ULCORNER)
-    window.addch(0, 1, curses.ACS_URCORNER)
-    window.move(0, board.width*2+2)
-    window.vline(curses.ACS_VLINE, board.height+1)
-    window.move(0, board.width*2+3)
-    window.vline(curses.ACS_VLINE, board.height+2)
-    window.addch(0, board.width*2+2, curses.ACS_ULCORNER)
-    window.addch(0, board.width*2+3, curses.ACS_URCORNER)
-    window.move(board.height+1, 0)
-    window.hline(curses.ACS_HLINE, board.width*2+3)
-    window.move(board.height, 1)
-    window.hline(curses.ACS_HLINE, board.width*2+1)
-    window.addch(board.height+1, 0, curses.ACS_LLCORNER)
-    window.addch(board.height, 1, curses.ACS_LLCORNER)
-    window.addch(board.height+1, board.width*2+3, curses.ACS_LRCORNER)
-    window.addch(board.height, board.width*2+2, curses.ACS_LRCORNER)
-    window.move(board.height+2, 0)
-
-    window.refresh()
+        # Draw the Discards
+        if board.discards_remaining != self.discards:
+            self.discards = board.discards_remaining
+            discards = board.discards_remaining
+            if discards >= 5:
+                s1 = "X X X X X"
+                s2 = (discards - 5)*" X" + (10-discards)*"  "
+            else:
+                s1 = discards*"X " + (5-discards)*"  "
+                s2 = "          "
+            window.addstr(11, (board.width*2)+5, s1,
+                          curses.color_pair(COLOR_DISCARD))
+            window.addstr(12, (board.width*2)+5, s2,
+                          curses.color_pair(COLOR_DISCARD))
+
+    def render(self):
+        """
+        Write a depiction of the board to the terminal.
+        """
+
+        # Draw the latest snapshot; the game may be played in another
+        # thread.
+        board = self.board.snapshot
+        self.render_cells(board)
+        self.render_panel(board)
+        self.window.move(self.board.height+2, 0)
+
+        # Send all the changes to the terminal at once.
+        self.window.noutrefresh()
+        curses.doupdate()
 
 
 class UserPlayer(Player):
@@ -175,42 +240,68 @@ class UserPlayer(Player):
             raise SystemExit
 
 
-def run(window):
-    board = Board(BOARD_WIDTH, BOARD_HEIGHT)
+def run(window, args):
     adversary = RandomAdversary(DEFAULT_SEED, BLOCK_LIMIT)
 
-    args = parser.parse_args()
     if args.manual:
         window.timeout(INTERVAL)
         player = UserPlayer(window)
     else:
-        window.timeout(0)
+        # Wait for keys between frames.
+        window.timeout(1000 // FRAMES_PER_SECOND)
         player = SelectedPlayer()
 
-    try:
-        for move in board.run(player, adversary):
-            render(window, board)
-
-            if not args.manual:
-                while True:
-                    key = window.getch()
-                    if key == -1:
-                        break
-                    elif key == curses.ascii.ESC:
-                        raise SystemExit
-            sleep(0.1)
-    except BlockLimitException:
-        window.addstr(BOARD_HEIGHT//2, 2,
+    board, moves = start_game(args, player, adversary)
+    if args.record:
+        recorder = Recorder()
+        moves = recorder.record(moves)
+
+    renderer = Renderer(window, board)
+    if args.manual:
+        try:
+            for move in moves:
+                renderer.render()
+                sleep(0.1)
+            out_of_blocks = False
+        except BlockLimitException:
+            out_of_blocks = True
+    else:
+        # The game is played in its own thread; draw whatever the board
+        # looks like at every frame.
+        pacer = Pacer(0.1, SPEED_NAMES[args.speed])
+        simulation = Simulation(moves, pacer)
+        simulation.start()
+        while simulation.is_alive():
+            renderer.render()
+            key = window.getch()
+            if key == curses.ascii.ESC:
+                raise SystemExit
+            elif 0 <= key < 256:
+                pacer.key(chr(key))
+        renderer.render()
+        out_of_blocks = simulation.out_of_blocks
+
+    if out_of_blocks:
+        window.addstr(board.height//2, 2,
                       "Out of blocks", curses.color_pair(COLOR_NOTHING))
-    window.addstr(BOARD_HEIGHT//2+1, 2,
+
+    if args.record:
+        with ArchiveWriter(args.record, board.width, board.height) as writer:
+            writer.add(recorder.events, board.score)
+
+    window.addstr(board.height//2+1, 2,
                   "Score="+ str(board.score), curses.color_pair(COLOR_NOTHING))
-    window.addstr(BOARD_HEIGHT//2+2, 2,
+    window.addstr(board.height//2+2, 2,
                   "Press a key to exit", curses.color_pair(COLOR_NOTHING))
     window.timeout(-1)
     window.getch()
 
 
-if __name__ == '__main__':
+def main(argv=None):
+    args = parser.parse_args(argv)
+    if args.record and args.resume:
+        parser.error('a resumed game cannot be recorded')
+
     try:
         # Initialize terminal settings
         curses.initscr()
@@ -219,8 +310,8 @@ if __name__ == '__main__':
         curses.cbreak()
 
         window = curses.newwin(
-            BOARD_HEIGHT + 3,
-            (BOARD_WIDTH + 2 + 7)*2 + 1
+            args.height + 3,
+            (args.width + 2 + 7)*2 + 1
         )
         window.keypad(True)
 
@@ -245,7 +336,7 @@ if __name__ == '__main__':
         )
         curses.init_pair(COLOR_BOMB, curses.COLOR_BLACK, curses.COLOR_WHITE)
 
-        run(window)
+        run(window, args)
     finally:
         # Clean up terminal settings once we are done
         window.keypad(False)
@@ -253,3 +344,7 @@ if __name__ == '__main__':
         curses.nocbreak()
         curses.echo()
         curses.endwin()
+
+
+if __name__ == '__main__':
+    main()
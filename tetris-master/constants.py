@@ -5,6 +5,12 @@ DEFAULT_SEED = 42
 
 BLOCK_LIMIT = 400
 
+# Blocks between checkpoints of a game.
+SAVE_INTERVAL = 10
+
+# Surfaces remembered by a placement cache.
+PLACEMENT_CACHE_SIZE = 100000
+
 INTERVAL = 1000
 
 PREFIX = '<TETRIS WIRE PROTOCOL>'
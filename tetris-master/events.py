@@ -0,0 +1,21 @@
+from collections import namedtuple
+
+# Changes to a board, as passed to the listeners given to Board.subscribe.
+# Cells are frozensets of (x, y) positions.
+
+# A new block started falling.
+BlockSpawned = namedtuple('BlockSpawned', ['shape', 'cells'])
+# The falling block moved or rotated without landing.
+BlockMoved = namedtuple('BlockMoved', ['cells'])
+# The falling block landed and its cells became part of the board.
+BlockLanded = namedtuple('BlockLanded', ['shape', 'color', 'cells'])
+# Full rows were removed, from the top down, and the rows above shifted.
+RowsCleared = namedtuple('RowsCleared', ['rows'])
+# A bomb landed at cell. The cells around it were removed, then the cells
+# above moved down, as (from, to) pairs.
+BombExploded = namedtuple('BombExploded', ['cell', 'removed', 'shifted'])
+# The next block was chosen or replaced by a bomb.
+NextChanged = namedtuple('NextChanged', ['shape'])
+ScoreChanged = namedtuple('ScoreChanged', ['score'])
+CountersChanged = namedtuple('CountersChanged',
+                             ['bombs_remaining', 'discards_remaining'])
@@ -0,0 +1,157 @@
+# Scores boards from the bitmasks of their rows, bit x standing for column
+# x. Everything that depends on the pattern of a single row is looked up in
+# tables built once per board size, so that a board takes a few lookups per
+# row instead of a scan of its cells.
+
+# Features of a board, in the order of the weight vector.
+FEATURES = (
+    # Empty cells with a filled cell somewhere above them.
+    'holes',
+    # Changes between filled and empty cells along the rows, the walls
+    # counting as filled. Rows above the stack are left out.
+    'row_transitions',
+    # Changes between filled and empty cells down the columns, the floor
+    # counting as filled.
+    'column_transitions',
+    # Empty cells with a filled cell or wall on either side, each counting
+    # as deep as it lies in its well: a well three cells deep counts
+    # 1 + 2 + 3.
+    'wells',
+    # Rows between the top of the stack and the floor.
+    'height',
+)
+
+# Roughly the weights of Pierre Dellacherie's player. It also weighs the
+# landing height and eroded cells of the last block, which are not features
+# of the board; the height of the stack stands in for them.
+DEFAULT_WEIGHTS = {
+    'holes': -7.9,
+    'row_transitions': -3.2,
+    'column_transitions': -9.3,
+    'wells': -3.4,
+    'height': -1,
+}
+
+
+class RowTables:
+    """
+    Everything needed about every possible row of a board of the given
+    size, indexed by the bitmask of the row.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.full = (1 << width) - 1
+        size = 1 << width
+
+        self.popcount = [bin(mask).count('1') for mask in range(size)]
+
+        # The row with a filled wall on either side, shifted one column to
+        # the right.
+        walled = [(mask << 1) | 1 | (1 << (width + 1)) for mask in range(size)]
+        self.transitions = [bin(row ^ (row >> 1)).count('1') - 1
+                            for row in walled]
+        # Empty cells with something filled on both sides.
+        self.wells = [(row >> 2) & row & ~(row >> 1) & self.full
+                      for row in walled]
+
+        # Well depths are counted for all columns at once in a single
+        # integer, a field of `field` bits per column. The fields are big
+        # enough to hold the sum of all of them, which is how they are
+        # added up.
+        self.field = (width * height).bit_length()
+        self.units = sum(1 << (self.field * x) for x in range(width))
+        # Every field set in full for the columns in a mask.
+        self.spread = [
+            sum(((1 << self.field) - 1) << (self.field * x)
+                for x in range(width) if mask >> x & 1)
+            for mask in range(size)
+        ]
+
+
+# Tables are only built for the board sizes actually used.
+tables = {}
+
+
+def row_tables(width, height):
+    if (width, height) not in tables:
+        tables[width, height] = RowTables(width, height)
+    return tables[width, height]
+
+
+def row_masks(board):
+    """
+    Returns the bitmasks of the rows of the board, from the top down.
+    """
+
+    rows = [0] * board.height
+    for (x, y) in board.cells:
+        rows[y] |= 1 << x
+    return rows
+
+
+class Evaluator:
+    """
+    Scores a board as a weighted sum of its FEATURES, in O(height) table
+    lookups once the row bitmasks are known.
+    """
+
+    def __init__(self, weights=None):
+        if weights is None:
+            weights = DEFAULT_WEIGHTS
+        self.weights = [weights.get(feature, 0) for feature in FEATURES]
+
+    def features(self, rows, width):
+        """
+        Returns the features of the board with the given rows, from the
+        top down, in the order of FEATURES.
+        """
+
+        tables = row_tables(width, len(rows))
+        popcount = tables.popcount
+        transitions = tables.transitions
+        well_cells = tables.wells
+        spread = tables.spread
+        units = tables.units
+        full = tables.full
+        # The sum of the well depths of all columns ends up in the top
+        # field when multiplying by a one in every field.
+        top = tables.field * (width - 1)
+        field_mask = (1 << tables.field) - 1
+
+        # Rows above the stack add nothing.
+        y = 0
+        while y < len(rows) and not rows[y]:
+            y += 1
+        height = len(rows) - y
+
+        holes = 0
+        row_transitions = 0
+        column_transitions = 0
+        wells = 0
+        # Columns with something filled in or above the current row.
+        covered = 0
+        # Well depths so far, a field per column.
+        depths = 0
+        above = 0
+        for row in rows[y:]:
+            covered |= row
+            holes += popcount[covered & ~row & full]
+            row_transitions += transitions[row]
+            column_transitions += popcount[row ^ above]
+            above = row
+
+            # Columns still in a well go one deeper, the others start
+            # again at zero.
+            depths = (depths + units) & spread[well_cells[row]]
+            wells += (depths * units) >> top & field_mask
+        column_transitions += popcount[above ^ full]
+
+        return holes, row_transitions, column_transitions, wells, height
+
+    def evaluate_rows(self, rows, width):
+        return sum(weight * feature for weight, feature
+                   in zip(self.weights, self.features(rows, width)))
+
+    def evaluate(self, board):
+        return self.evaluate_rows(row_masks(board), board.width)
@@ -0,0 +1,357 @@
+import argparse
+import asyncio
+from sys import stderr
+from time import perf_counter
+
+from adversary import RandomAdversary
+from board import Board, action_function
+from constants import BOARD_HEIGHT, BOARD_WIDTH, BLOCK_LIMIT, DEFAULT_SEED, \
+    PREFIX
+from exceptions import BlockLimitException, UnknownInstructionException
+from protocol import HELLO, BATCH, MUX, START, hello_reply, parse_actions
+from spectators import Broadcast, Spectator
+
+parser = argparse.ArgumentParser(
+    description='Host many games at once over TCP or Unix sockets'
+)
+address = parser.add_mutually_exclusive_group(required=True)
+address.add_argument('--tcp', metavar='HOST:PORT',
+                     help='Listen on a TCP address')
+address.add_argument('--unix', metavar='PATH',
+                     help='Listen on a Unix socket')
+parser.add_argument('--seed', type=int, default=DEFAULT_SEED,
+                    help='Seed of the first session; session n uses seed+n')
+parser.add_argument('--blocks', type=int, default=BLOCK_LIMIT)
+parser.add_argument('--max-sessions', type=int, default=10000,
+                    help='Sessions played at once; further connections wait')
+parser.add_argument('--report', type=float, default=5,
+                    help='Seconds between metrics reports')
+parser.add_argument('--mux', default=False, action='store_true',
+                    help='Play many games per connection, tagged by game id')
+watch = parser.add_mutually_exclusive_group()
+watch.add_argument('--watch-tcp', metavar='HOST:PORT',
+                   help='Let spectators watch games on a TCP address')
+watch.add_argument('--watch-unix', metavar='PATH',
+                   help='Let spectators watch games on a Unix socket')
+
+# Longest line accepted from a player.
+LINE_LIMIT = 64 * 1024
+
+# Protocol extensions sessions can use.
+SUPPORTED = {BATCH}
+
+
+class Metrics:
+    """
+    Counters reported periodically by the server.
+    """
+
+    def __init__(self):
+        self.active = 0
+        self.finished = 0
+        self.moves = 0
+        self.latencies = []
+
+    def report(self, elapsed):
+        latencies = sorted(self.latencies)
+        if latencies:
+            mean = sum(latencies) / len(latencies)
+            p99 = latencies[int(len(latencies) * 0.99)]
+            latency = f'latency mean {mean*1e3:.2f} ms p99 {p99*1e3:.2f} ms'
+        else:
+            latency = 'latency -'
+
+        stderr.write(f'sessions {self.active} active {self.finished} '
+                     f'finished, {self.moves/elapsed:.0f} moves/s, '
+                     f'{latency}\n')
+
+        self.moves = 0
+        self.latencies = []
+
+
+class StreamChannel:
+    """
+    The messages of a session that has a connection to itself.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def readline(self):
+        return (await self.reader.readline()).decode()
+
+    def write(self, message):
+        self.writer.write(f'{message}\n'.encode())
+
+    async def drain(self):
+        await self.writer.drain()
+
+
+class MuxChannel:
+    """
+    The messages of one of the sessions sharing a multiplexed connection.
+    Incoming messages are routed to it by the connection, and outgoing
+    messages are tagged with its game id.
+    """
+
+    def __init__(self, tag, writer):
+        self.tag = tag
+        self.writer = writer
+        self.queue = asyncio.Queue()
+
+    async def readline(self):
+        return await self.queue.get()
+
+    def write(self, message):
+        self.writer.write(
+            f'{PREFIX} {self.tag} {message[len(PREFIX)+1:]}\n'.encode())
+
+    async def drain(self):
+        await self.writer.drain()
+
+
+class Session:
+    """
+    A single game, played by the peer on the other end of a channel using
+    the same protocol as client.py.
+    """
+
+    result = None
+
+    def __init__(self, channel, seed, blocks, metrics):
+        self.channel = channel
+        self.metrics = metrics
+        self.board = Board(BOARD_WIDTH, BOARD_HEIGHT)
+        self.adversary = RandomAdversary(seed, blocks)
+        self.broadcast = Broadcast(self.board)
+
+    def send(self, message):
+        self.channel.write(f'{PREFIX} {message}')
+
+    async def read_actions(self):
+        """
+        Waits for the next instruction that holds actions, answering any
+        HELLO along the way.
+        """
+
+        while True:
+            line = await self.channel.readline()
+            if not line:
+                raise UnknownInstructionException
+
+            instruction = line.strip()
+            if not instruction.startswith(PREFIX):
+                continue
+
+            instruction = instruction[len(PREFIX)+1:]
+            if instruction.startswith(HELLO):
+                reply = hello_reply(instruction, SUPPORTED)
+                self.channel.write(f'{PREFIX} {reply}')
+                continue
+
+            return parse_actions(instruction)
+
+    async def play(self):
+        """
+        Plays the game the same way Board.run does, awaiting the player
+        instead of blocking on it.
+        """
+
+        board = self.board
+        self.send(board.run_adversary(self.adversary).value)
+        board.place_next_block()
+
+        while True:
+            self.send(board.run_adversary(self.adversary).value)
+            if self.broadcast.spectators:
+                self.broadcast.publish()
+
+            if not board.alive:
+                return
+
+            # Only wait for the peer to read once per turn; a slow reader
+            # holds up its own session and nothing else.
+            await self.channel.drain()
+            sent = perf_counter()
+
+            landed = False
+            while not landed:
+                actions = await self.read_actions()
+                if sent is not None:
+                    self.metrics.latencies.append(perf_counter() - sent)
+                    sent = None
+
+                for action in actions:
+                    landed = action_function(action)(board, action)
+                    self.metrics.moves += 1
+                    if self.broadcast.spectators:
+                        self.broadcast.publish()
+                    if landed:
+                        break
+
+    async def run(self):
+        try:
+            await self.play()
+        except BlockLimitException:
+            self.result = 'WON'
+        except (UnknownInstructionException, ConnectionError, ValueError):
+            # ValueError stands for a line over LINE_LIMIT or one that is
+            # not UTF-8.
+            self.result = 'ABORTED'
+            return
+        else:
+            self.result = 'LOST'
+        finally:
+            self.broadcast.close(self.result)
+
+        self.send(self.result)
+
+        try:
+            await self.channel.drain()
+        except ConnectionError:
+            pass
+
+
+class GameServer:
+    def __init__(self, seed, blocks, max_sessions, mux=False):
+        self.seed = seed
+        self.blocks = blocks
+        self.mux = mux
+        self.sessions = 0
+        self.slots = asyncio.Semaphore(max_sessions)
+        self.metrics = Metrics()
+        # Sessions being played, by session number.
+        self.games = {}
+
+    async def play(self, channel):
+        number = self.sessions
+        self.sessions += 1
+
+        async with self.slots:
+            session = Session(channel, self.seed + number, self.blocks,
+                              self.metrics)
+            self.games[number] = session
+            self.metrics.active += 1
+            try:
+                await session.run()
+            finally:
+                self.metrics.active -= 1
+                self.metrics.finished += 1
+                del self.games[number]
+
+    async def handle_watch(self, reader, writer):
+        """
+        Streams the frames of the session asked for with WATCH <number>.
+        """
+
+        try:
+            line = (await reader.readline()).decode().strip()
+            command = line[len(PREFIX)+1:].split()
+            if not line.startswith(PREFIX) or len(command) != 2 \
+               or command[0] != 'WATCH' or not command[1].isdigit() \
+               or int(command[1]) not in self.games:
+                writer.write(f'{PREFIX} UNKNOWN\n'.encode())
+                return
+
+            broadcast = self.games[int(command[1])].broadcast
+            spectator = Spectator(writer)
+            broadcast.add(spectator)
+            try:
+                await spectator.run()
+            finally:
+                broadcast.remove(spectator)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle(self, reader, writer):
+        try:
+            if self.mux:
+                await self.handle_mux(reader, writer)
+            else:
+                await self.play(StreamChannel(reader, writer))
+        finally:
+            writer.close()
+
+    async def handle_mux(self, reader, writer):
+        """
+        Routes the messages of a multiplexed connection to its sessions,
+        starting a session for every START.
+        """
+
+        channels = {}
+        games = []
+        while True:
+            try:
+                line = await reader.readline()
+                instruction = line.decode().strip()
+            except ValueError:
+                # A line over LINE_LIMIT or one that is not UTF-8, which
+                # cannot even be told apart by game; the games are aborted
+                # as if the connection was gone.
+                break
+            if not line:
+                break
+
+            if not instruction.startswith(PREFIX):
+                continue
+
+            instruction = instruction[len(PREFIX)+1:]
+            if instruction.startswith(HELLO):
+                reply = hello_reply(instruction, SUPPORTED | {MUX})
+                writer.write(f'{PREFIX} {reply}\n'.encode())
+                continue
+
+            tag, _, message = instruction.partition(' ')
+            if message == START:
+                channels[tag] = MuxChannel(tag, writer)
+                games.append(asyncio.create_task(self.play(channels[tag])))
+            elif tag in channels:
+                channels[tag].queue.put_nowait(f'{PREFIX} {message}')
+
+        # The connection is gone; let the sessions still waiting notice.
+        for channel in channels.values():
+            channel.queue.put_nowait('')
+        await asyncio.gather(*games)
+
+    async def report(self, interval):
+        last = perf_counter()
+        while True:
+            await asyncio.sleep(interval)
+            now = perf_counter()
+            self.metrics.report(now - last)
+            last = now
+
+    async def serve(self, args):
+        if args.unix:
+            server = await asyncio.start_unix_server(
+                self.handle, args.unix, limit=LINE_LIMIT)
+        else:
+            host, port = args.tcp.rsplit(':', 1)
+            server = await asyncio.start_server(
+                self.handle, host, int(port), limit=LINE_LIMIT)
+
+        if args.watch_unix:
+            await asyncio.start_unix_server(self.handle_watch,
+                                            args.watch_unix)
+        elif args.watch_tcp:
+            host, port = args.watch_tcp.rsplit(':', 1)
+            await asyncio.start_server(self.handle_watch, host, int(port))
+
+        reporter = asyncio.create_task(self.report(args.report))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            reporter.cancel()
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    server = GameServer(args.seed, args.blocks, args.max_sessions, args.mux)
+    try:
+        asyncio.run(server.serve(args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,42 @@
+from adversary import RandomAdversary
+from arguments import parser
+from checkpoint import start_game
+from constants import DEFAULT_SEED, BLOCK_LIMIT
+from exceptions import BlockLimitException
+from player import SelectedPlayer
+from replay import Recorder, ArchiveWriter
+
+
+def main(argv=None):
+    """
+    Plays a game without drawing it, as fast as the player can, and prints
+    the score.
+    """
+
+    args = parser.parse_args(argv)
+    if args.manual:
+        parser.error('a game without a display cannot be played manually')
+    if args.record and args.resume:
+        parser.error('a resumed game cannot be recorded')
+
+    adversary = RandomAdversary(DEFAULT_SEED, BLOCK_LIMIT)
+    board, moves = start_game(args, SelectedPlayer(), adversary)
+    if args.record:
+        recorder = Recorder()
+        moves = recorder.record(moves)
+
+    try:
+        for move in moves:
+            pass
+    except BlockLimitException:
+        print("Out of blocks")
+
+    if args.record:
+        with ArchiveWriter(args.record, board.width, board.height) as writer:
+            writer.add(recorder.events, board.score)
+
+    print("Score=", board.score)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import argparse
+
+import numpy as np
+
+from fasteval import DEFAULT_WEIGHTS, row_tables
+
+parser = argparse.ArgumentParser(
+    description='Write a linear value model with the weights of the fast '
+                'evaluator, as a starting point for models trained offline'
+)
+parser.add_argument('output', help='File to write the model to (.npz)')
+parser.add_argument('--width', type=int, default=10,
+                    help='Number of columns of the boards it scores')
+
+# Features describing a whole board, followed by the height and the holes
+# of every column.
+BOARD_FEATURES = ['holes', 'row_transitions', 'column_transitions', 'wells',
+                  'height', 'bumpiness', 'cleared']
+
+
+def feature_names(width):
+    return BOARD_FEATURES + \
+        [f'height_{x}' for x in range(width)] + \
+        [f'holes_{x}' for x in range(width)]
+
+
+# The tables of fasteval as arrays, by board size.
+tables = {}
+
+
+def array_tables(width, height):
+    if (width, height) not in tables:
+        rows = row_tables(width, height)
+        masks = np.arange(1 << width)
+        # Every mask split into one 0 or 1 per column.
+        bits = ((masks[:, None] >> np.arange(width)) & 1).astype(np.int16)
+        tables[width, height] = (np.array(rows.popcount),
+                                 np.array(rows.transitions),
+                                 np.array(rows.wells),
+                                 bits)
+    return tables[width, height]
+
+
+def board_features(rows, cleared, width):
+    """
+    Returns the features of a batch of boards, one row each. rows holds
+    the row bitmasks of every board from the top down, and cleared the
+    number of rows each board had removed. The features are worked out for
+    all the boards at once, mostly by looking rows up in the tables of
+    fasteval, with the same operations whatever their number.
+    """
+
+    count, height = rows.shape
+    popcount, transitions, well_cells, bits = array_tables(width, height)
+
+    # Columns with something filled in or above each row.
+    covered = np.bitwise_or.accumulate(rows, axis=1)
+    holes = popcount[covered & ~rows]
+    stack = covered != 0
+    row_transitions = (transitions[rows] * stack).sum(axis=1)
+    # The floor counts as filled.
+    above = np.concatenate([np.zeros((count, 1), dtype=rows.dtype), rows],
+                           axis=1)
+    below = np.concatenate([rows, np.full((count, 1), (1 << width) - 1)],
+                           axis=1)
+    column_transitions = popcount[above ^ below].sum(axis=1)
+
+    # Each well cell counts as deep as it lies in its well: the number of
+    # well cells in its column since the last cell that was not.
+    well = bits[well_cells[rows]]
+    runs = np.cumsum(well, axis=1)
+    restarts = np.maximum.accumulate(runs * (1 - well), axis=1)
+    wells = (runs - restarts).sum(axis=(1, 2))
+
+    column_heights = bits[covered].sum(axis=1)
+    column_holes = bits[covered & ~rows].sum(axis=1)
+    bumpiness = np.abs(np.diff(column_heights, axis=1)).sum(axis=1)
+
+    return np.column_stack([
+        holes.sum(axis=1),
+        row_transitions,
+        column_transitions,
+        wells,
+        stack.sum(axis=1),
+        bumpiness,
+        cleared,
+        column_heights,
+        column_holes,
+    ]).astype(np.float32)
+
+
+class ValueModel:
+    """
+    Scores boards with a model trained offline: either linear, with weights
+    `w` and bias `b`, or a perceptron with one hidden layer of rectified
+    units, with weights `w1`, `b1`, `w2` and `b2`. A batch of boards is
+    scored with a matrix multiply per layer.
+    """
+
+    def __init__(self, layers, features):
+        self.layers = layers
+        self.features = features
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a model from a .npz file holding its weights and the names of
+        the features it was trained on.
+        """
+
+        with np.load(path) as data:
+            features = [str(name) for name in data['features']]
+            if 'w1' in data:
+                layers = [(data['w1'], data['b1']), (data['w2'], data['b2'])]
+            else:
+                layers = [(data['w'], data['b'])]
+        layers = [(w.astype(np.float32), b.astype(np.float32))
+                  for w, b in layers]
+        return cls(layers, features)
+
+    def save(self, path):
+        if len(self.layers) == 1:
+            (w, b), = self.layers
+            weights = {'w': w, 'b': b}
+        else:
+            (w1, b1), (w2, b2) = self.layers
+            weights = {'w1': w1, 'b1': b1, 'w2': w2, 'b2': b2}
+        np.savez(path, features=np.array(self.features), **weights)
+
+    def evaluate_batch(self, rows, cleared, width):
+        """
+        Returns the scores of the boards with the given row bitmasks, from
+        the top down, and numbers of rows removed.
+        """
+
+        if self.features != feature_names(width):
+            raise ValueError(f'the model was not trained on boards '
+                             f'{width} columns wide')
+
+        values = board_features(np.array(rows, dtype=np.int64),
+                                np.array(cleared), width)
+        for layer, (w, b) in enumerate(self.layers):
+            if layer > 0:
+                values = np.maximum(values, 0)
+            values = values @ w + b
+        return values
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    features = feature_names(args.width)
+    w = np.array([DEFAULT_WEIGHTS.get(name, 0) for name in features],
+                 dtype=np.float32)
+    ValueModel([(w, np.float32(0))], features).save(args.output)
@@ -0,0 +1,203 @@
+import argparse
+import socket
+from multiprocessing import Pool
+from time import perf_counter
+
+from board import Board, Block, Shape, action_function
+from constants import BOARD_HEIGHT, BOARD_WIDTH, PREFIX
+from exceptions import UnknownInstructionException
+from player import Player, SelectedPlayer
+from protocol import HELLO, BATCH, MUX, START, format_batch
+from replay import encode_board, decode_board
+
+parser = argparse.ArgumentParser(
+    description='Play many games at once over a single connection'
+)
+address = parser.add_mutually_exclusive_group(required=True)
+address.add_argument('--tcp', metavar='HOST:PORT',
+                     help='Connect to a game_server.py --mux on TCP')
+address.add_argument('--unix', metavar='PATH',
+                     help='Connect to a game_server.py --mux on a Unix socket')
+parser.add_argument('--games', type=int, default=100,
+                    help='Number of games to play in total')
+parser.add_argument('--in-flight', type=int, default=32,
+                    help='Number of games played at the same time')
+parser.add_argument('--workers', type=int, default=0,
+                    help='Choose moves in a pool of this many processes')
+
+
+def choose_encoded(data):
+    return SelectedPlayer().choose_action(decode_board(data))
+
+
+class PooledPlayer(Player):
+    """
+    Chooses the moves for many boards at once in a pool of processes.
+    """
+
+    def __init__(self, workers):
+        self.pool = Pool(workers)
+
+    def choose_action(self, board):
+        return choose_encoded(encode_board(board))
+
+    def choose_actions(self, boards):
+        return self.pool.map(choose_encoded, map(encode_board, boards))
+
+
+class Game:
+    """
+    The player's copy of one of the games on the connection.
+    """
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.board = Board(BOARD_WIDTH, BOARD_HEIGHT)
+        self.result = None
+
+    def receive(self, command):
+        """
+        Handles a message from the server. Returns True if the player has
+        to decide on a move.
+        """
+
+        if command == 'WON' or command == 'LOST':
+            self.result = command
+            return False
+
+        try:
+            shape = Shape(command)
+        except ValueError:
+            raise UnknownInstructionException
+
+        # Mirror Board.run: the first shape falls straight away.
+        self.board.next = Block(shape)
+        if self.board.falling is None:
+            self.board.place_next_block()
+            return False
+        return True
+
+    def play(self, actions, player):
+        """
+        Applies the chosen actions until the block lands, returning the
+        message that tells the server what was done.
+        """
+
+        board = self.board
+        played = []
+        while True:
+            try:
+                actions = iter(actions)
+            except TypeError:
+                actions = [actions]
+
+            for action in actions:
+                played.append(action)
+                if action_function(action)(board, action):
+                    return f'{self.tag} {format_batch(played)}'
+
+            # The player stopped short of landing the block; ask again.
+            actions = player.choose_action(board.clone())
+
+
+def connect(args):
+    if args.unix:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(args.unix)
+    else:
+        host, port = args.tcp.rsplit(':', 1)
+        sock = socket.create_connection((host, int(port)))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+def negotiate(reader, writer):
+    """
+    Asks for MUX, and waits for the server to agree before any game is
+    started. A server without MUX starts a game straight away, so anything
+    but a HELLO reply agreeing to it means it does not support it.
+    """
+
+    writer.write(f'{PREFIX} {HELLO} {MUX} {BATCH}\n')
+    writer.flush()
+    while True:
+        line = reader.readline()
+        if not line:
+            raise SystemExit('The server closed the connection')
+        instruction = line.strip()
+        if not instruction.startswith(PREFIX):
+            continue
+
+        instruction = instruction[len(PREFIX)+1:]
+        if not instruction.startswith(HELLO) \
+           or MUX not in instruction.split():
+            raise SystemExit('The server does not support MUX')
+        return
+
+
+def run(args):
+    if args.workers:
+        player = PooledPlayer(args.workers)
+    else:
+        player = SelectedPlayer()
+
+    sock = connect(args)
+    reader = sock.makefile('r')
+    writer = sock.makefile('w')
+
+    negotiate(reader, writer)
+    games = {}
+    started = 0
+    finished = []
+    # Number of messages we are waiting for, before everything in flight
+    # has been heard from.
+    expected = 0
+
+    start = perf_counter()
+    while games or started < args.games:
+        while len(games) < args.in_flight and started < args.games:
+            tag = f'@{started}'
+            games[tag] = Game(tag)
+            writer.write(f'{PREFIX} {tag} {START}\n')
+            # Every game starts with the falling and the next shape.
+            expected += 2
+            started += 1
+        writer.flush()
+
+        # Collect a message from every game in flight, then decide for all
+        # of them together.
+        deciding = []
+        while expected:
+            line = reader.readline()
+            if not line:
+                raise SystemExit
+            instruction = line.strip()
+            if not instruction.startswith(PREFIX):
+                continue
+            expected -= 1
+
+            instruction = instruction[len(PREFIX)+1:]
+            tag, _, command = instruction.partition(' ')
+            game = games[tag]
+            if game.receive(command):
+                if game.board.alive:
+                    deciding.append(game)
+                else:
+                    # The server follows up with LOST.
+                    expected += 1
+            elif game.result is not None:
+                finished.append(game.board.score)
+                del games[tag]
+
+        boards = [game.board.clone() for game in deciding]
+        for game, actions in zip(deciding, player.choose_actions(boards)):
+            writer.write(f'{PREFIX} {game.play(actions, player)}\n')
+            expected += 1
+
+    elapsed = perf_counter() - start
+    print(f'{len(finished)} games in {elapsed:.1f}s, '
+          f'mean score {sum(finished)/len(finished):.0f}')
+
+
+if __name__ == '__main__':
+    run(parser.parse_args())
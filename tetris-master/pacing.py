@@ -0,0 +1,60 @@
+from threading import Thread
+from time import sleep
+
+from exceptions import BlockLimitException
+
+# Speeds a game can be watched at, by the key that selects them. None
+# plays as fast as the player can.
+SPEEDS = {
+    '1': 1,
+    '2': 10,
+    '3': None,
+}
+SPEED_NAMES = {'1': 1, '10': 10, 'max': None}
+
+
+class Pacer:
+    """
+    Spaces out the moves of a game so that it can be watched. The speed
+    can be changed at any time from another thread.
+    """
+
+    def __init__(self, delay, speed=1):
+        self.delay = delay
+        self.speed = speed
+
+    def key(self, key):
+        """
+        Changes the speed if the key selects one. Returns True if it did.
+        """
+
+        if key not in SPEEDS:
+            return False
+        self.speed = SPEEDS[key]
+        return True
+
+    def pause(self):
+        if self.speed is not None:
+            sleep(self.delay / self.speed)
+
+
+class Simulation(Thread):
+    """
+    Plays a game in its own thread at the pace of a Pacer, so that a front
+    end can draw the board at its own frame rate, skipping the moves made
+    in between.
+    """
+
+    out_of_blocks = False
+
+    def __init__(self, moves, pacer):
+        super().__init__(daemon=True)
+        self.moves = moves
+        self.pacer = pacer
+
+    def run(self):
+        try:
+            for move in self.moves:
+                self.pacer.pause()
+        except BlockLimitException:
+            self.out_of_blocks = True
@@ -0,0 +1,129 @@
+from collections import namedtuple
+
+from board import Board, Block, Direction, Rotation, Shape, shape_to_cells
+
+# A way a shape can be turned: the number of clockwise turns from the way it
+# spawns, its cells with the top left at (0, 0), its width, and its skirt,
+# the lowest cell in each of its columns.
+Orientation = namedtuple('Orientation', ['turns', 'cells', 'width', 'skirt'])
+
+# Where a block comes to rest when dropped straight down: x and y of the top
+# left of its orientation, and the cells it covers on the board.
+Placement = namedtuple('Placement', ['orientation', 'x', 'y', 'cells'])
+
+
+def normalize(cells):
+    left = min(x for (x, y) in cells)
+    top = min(y for (x, y) in cells)
+    return frozenset((x - left, y - top) for (x, y) in cells)
+
+
+def find_orientations(shape):
+    """
+    Turns a block of the shape clockwise on an empty board, the way the
+    game does, and returns every distinct way it ends up.
+    """
+
+    board = Board(8, 8)
+    block = Block(shape)
+    block.initialize(board)
+    block.move(Direction.Down, board, 2)
+
+    orientations = []
+    seen = set()
+    for turns in range(4):
+        cells = normalize(block.cells)
+        if cells not in seen:
+            seen.add(cells)
+            width = max(x for (x, y) in cells) + 1
+            skirt = tuple(max(y for (x, y) in cells if x == column)
+                          for column in range(width))
+            orientations.append(Orientation(turns, cells, width, skirt))
+        block.rotate(Rotation.Clockwise, board)
+    return orientations
+
+
+ORIENTATIONS = {shape: find_orientations(shape) for shape in shape_to_cells}
+
+
+def column_tops(board):
+    """
+    Returns the topmost filled row of every column, or the height of the
+    board for empty columns.
+    """
+
+    tops = [board.height] * board.width
+    for (x, y) in board.cells:
+        if y < tops[x]:
+            tops[x] = y
+    return tops
+
+
+def landing_row(tops, orientation, x):
+    """
+    Returns the row the top of the orientation comes to rest on when
+    dropped in column x, from the skirt alone.
+    """
+
+    return min(tops[x + dx] - 1 - bottom
+               for dx, bottom in enumerate(orientation.skirt))
+
+
+def placements(board, shape, tops=None):
+    """
+    Yields every placement of the shape dropped straight down from above
+    the stack, orientation by orientation and left to right, leaving out
+    those that would stick out of the top of the board. Blocks are not
+    moved: the landing row takes a lookup per column of the block.
+    """
+
+    if tops is None:
+        tops = column_tops(board)
+    for orientation in ORIENTATIONS[shape]:
+        for x in range(board.width - orientation.width + 1):
+            y = landing_row(tops, orientation, x)
+            if y < 0:
+                continue
+            yield Placement(orientation, x, y,
+                            frozenset((x + dx, y + dy)
+                                      for (dx, dy) in orientation.cells))
+
+
+def placement_moves(board, placement):
+    """
+    Returns the moves taking the falling block to the placement: turns, then
+    shifts, then a drop. Returns None if the block cannot be turned that
+    way where it is. A block stopped by the stack on its way sideways lands
+    elsewhere.
+    """
+
+    block = board.falling.clone()
+    for turn in range(placement.orientation.turns):
+        block.rotate(Rotation.Clockwise, board)
+    if normalize(block.cells) != placement.orientation.cells:
+        return None
+
+    moves = [Rotation.Clockwise] * placement.orientation.turns
+    shift = placement.x - block.left
+    if shift > 0:
+        moves += [Direction.Right] * shift
+    else:
+        moves += [Direction.Left] * -shift
+    moves.append(Direction.Drop)
+    return moves
+
+
+def place_rows(rows, placement, width):
+    """
+    Returns the row bitmasks of a board, from the top down, once the block
+    has landed at the placement and full rows are removed, along with the
+    number of rows removed.
+    """
+
+    rows = list(rows)
+    for (x, y) in placement.cells:
+        rows[y] |= 1 << x
+    full = (1 << width) - 1
+    kept = [row for row in rows if row != full]
+    cleared = len(rows) - len(kept)
+    return [0] * cleared + kept, cleared
@@ -0,0 +1,129 @@
+from collections import OrderedDict
+from sys import stderr
+
+from checkpoint import write_atomically
+from constants import PLACEMENT_CACHE_SIZE
+from placement import ORIENTATIONS, Placement, landing_row, placement_moves
+
+VERSION = 1
+
+# Height differences between neighbouring columns are clipped to this, so
+# that surfaces differing only in how deep their deep wells are share
+# entries.
+CLIP = 2
+
+
+def surface_profile(tops):
+    """
+    Returns the differences in height between neighbouring columns, clipped
+    to CLIP either way.
+    """
+
+    return tuple(max(-CLIP, min(CLIP, tops[x] - tops[x+1]))
+                 for x in range(len(tops) - 1))
+
+
+class PlacementCache:
+    """
+    Remembers the placement a search chose for a surface profile, falling
+    shape and next shape, so that the next time the same surface comes up
+    the search can be skipped. Holes and the height of the stack are not
+    part of the key, so a remembered placement is only a good guess; one
+    that does not fit the board is treated as a miss.
+
+    The least recently used entries are dropped beyond `capacity`. The cache
+    is read from and written to `path`, if given.
+    """
+
+    def __init__(self, path=None, capacity=PLACEMENT_CACHE_SIZE):
+        self.path = path
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path is not None:
+            self.load()
+
+    def key(self, board, tops):
+        next = None if board.next is None else board.next.shape.value
+        return surface_profile(tops), board.falling.shape.value, next
+
+    def lookup(self, board, tops):
+        """
+        Returns the moves to the remembered placement for the board, or
+        None if there is none or it does not fit.
+        """
+
+        key = self.key(board, tops)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            moves = self.moves(board, tops, *entry)
+            if moves is not None:
+                self.hits += 1
+                return moves
+        self.misses += 1
+        return None
+
+    def moves(self, board, tops, turns, x):
+        for orientation in ORIENTATIONS[board.falling.shape]:
+            if orientation.turns == turns:
+                break
+        if x + orientation.width > board.width:
+            return None
+        y = landing_row(tops, orientation, x)
+        if y < 0:
+            return None
+        cells = frozenset((x + dx, y + dy) for (dx, dy) in orientation.cells)
+        return placement_moves(board, Placement(orientation, x, y, cells))
+
+    def store(self, board, tops, placement):
+        key = self.key(board, tops)
+        self.entries[key] = placement.orientation.turns, placement.x
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
+
+    def report(self):
+        return (f'placement cache: {self.hits} hits, {self.misses} misses '
+                f'({self.hit_rate():.1%}), {len(self.entries)} entries')
+
+    def load(self):
+        # json is only needed with a file to keep the cache in.
+        import json
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        if data.get('version') != VERSION or data.get('clip') != CLIP:
+            # Written for different keys; start afresh.
+            return
+        # Entries are stored from least to most recently used.
+        for profile, current, next, turns, x in data['entries']:
+            self.entries[tuple(profile), current, next] = turns, x
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def save(self):
+        import json
+        data = {
+            'version': VERSION,
+            'clip': CLIP,
+            'entries': [[list(profile), current, next, turns, x]
+                        for (profile, current, next), (turns, x)
+                        in self.entries.items()],
+        }
+        write_atomically(self.path, json.dumps(data).encode())
+
+    def close(self):
+        """
+        Saves the cache and reports how useful it was.
+        """
+
+        self.save()
+        stderr.write(self.report() + '\n')
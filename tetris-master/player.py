@@ -1,20 +1,94 @@
-import time
+import atexit
+from os import getenv
 from random import Random
 
 from board import Action, Direction, Shape, Rotation
+from fasteval import Evaluator, row_masks
+from placement import column_tops, placements, placement_moves, place_rows
 
 
 class Player:
     def choose_action(self, board):
         raise NotImplementedError
 
+    def choose_actions(self, boards):
+        """
+        Chooses the actions for several boards at once. Players that can
+        share work between boards may override this.
+        """
+
+        return [self.choose_action(board) for board in boards]
+
+# Weights of the features used by testBoard.scoreBoard. They can be
+# overridden with a JSON file, e.g. one written by tune.py, by pointing the
+# WEIGHTS environment variable at it.
+DEFAULT_WEIGHTS = {
+    'holes': -1000,
+    'bumpiness': -100,
+    'four_rows': 1,
+    'tetris': 90000,
+}
+
+
+def load_weights(path):
+    """
+    Reads feature weights from a JSON file; missing weights keep their
+    default value.
+    """
+
+    # json, and the re module behind it, are only imported when needed, to
+    # keep the player quick to start.
+    import json
+    with open(path) as f:
+        return {**DEFAULT_WEIGHTS, **json.load(f)}
+
+
+def save_weights(path, weights):
+    import json
+    from checkpoint import write_atomically
+    write_atomically(path, json.dumps(weights, indent=4).encode())
+
+
 class myPlayer(Player):
-    def __init__(self, seed=None):
+    def __init__(self, seed=None, weights=None, evaluator=None, search=None,
+                 cache=None, model=None):
         self.random = Random(seed)
-
-    def choose_action(self, board):
-        bestscore = -100000000
-        bestmoves = []
+        if weights is None and getenv('WEIGHTS'):
+            weights = load_weights(getenv('WEIGHTS'))
+        self.weights = DEFAULT_WEIGHTS if weights is None else weights
+        # Scores the boards instead of testBoard.scoreBoard when given,
+        # like the fasteval.Evaluator that EVALUATOR=fast selects.
+        if evaluator is None and getenv('EVALUATOR') == 'fast':
+            evaluator = Evaluator()
+        self.evaluator = evaluator
+        # A model.ValueModel trained offline, loaded from the file MODEL
+        # names. It scores all the boards of a drop search at once, in place
+        # of the evaluator. numpy is only imported when one is used.
+        if model is None and getenv('MODEL'):
+            from model import ValueModel
+            model = ValueModel.load(getenv('MODEL'))
+        self.model = model
+        # 'moves' plays out every rotation and column on a copy of the
+        # board; 'drop' works out where the block lands instead, and scores
+        # the boards with the model or evaluator, the fast one by default.
+        default = 'moves' if model is None else 'drop'
+        self.search = search or getenv('SEARCH', default)
+        # Placements the drop search chose before, possibly in earlier
+        # games when PLACEMENT_CACHE names the file to keep them in.
+        if cache is None and getenv('PLACEMENT_CACHE'):
+            from placement_cache import PlacementCache
+            cache = PlacementCache(getenv('PLACEMENT_CACHE'))
+            atexit.register(cache.close)
+        self.cache = cache
+
+    def candidates(self, board):
+        """
+        Scores every target rotation and column of the falling block.
+        Returns a list of (score, moves) tuples, ordered by column first
+        and rotation second.
+        """
+
+        candidates = []
         #check all the possible rotations and the positions of the block
         for tx in range(board.width):
             for rt in range(4):
@@ -22,60 +96,100 @@ class myPlayer(Player):
                 initScore = board.score
                 initFalling = board.falling
 
-                sandbox = testBoard(clonedBoard, initScore, initFalling)
-                score, moveList = sandbox.move_to_target(rt, tx)
-                # holes = sandbox.get_holes()
-
-                if (score> bestscore):
-                    bestscore = score
-                    bestmoves = moveList
-
-                    # if hole is made
-                    
-                    # print("bestscore", bestscore)
-                    # if (bestscore < -10000000):
-                    #     countdiscards = self.discards_remaining
-                    #     if (countdiscards > 0):
-                    #         bestmoves = [Action.Discard]
-                    #         countdiscards -= 1
-
-                for tx in range(board.width):
-                    for rt in range(4):
-                        clonedBoard = board.clone()
-                        initScore = board.score
-                        initFalling = board.falling
-
-                        sandbox2 = testBoard(clonedBoard, initScore, initFalling)
-                        score2, moveList2 = sandbox2.move_to_target(rt, tx)
-                        holes2 = sandbox2.get_holes()
-
-                        if (score2> bestscore):
-                            bestscore = score2
-                            bestmoves = moveList2
-
-                            
-                            
-                            # discards_remaining = 10
-                            # print("bestscore", bestscore)
-                            # print("holes2", holes2)
-                            
-                            # if (holes2 > 3):
-                            #     if (discards_remaining > 0):
-                            #         bestmoves = [Action.Discard]
-                            #         discards_remaining -= 1
-                            
-
+                sandbox = testBoard(clonedBoard, initScore, initFalling,
+                                    self.weights, self.evaluator)
+                candidates.append(sandbox.move_to_target(rt, tx))
+
+                # if hole is made
+                # if (bestscore < -10000000):
+                #     countdiscards = self.discards_remaining
+                #     if (countdiscards > 0):
+                #         bestmoves = [Action.Discard]
+                #         countdiscards -= 1
+
+        return candidates
+
+    def scored_placements(self, board, tops):
+        """
+        Scores every placement of the falling block dropped straight down,
+        without moving it. Returns a list of (score, moves, placement)
+        tuples, in the order of placement.placements.
+        """
+
+        rows = row_masks(board)
+        found = []
+        for placement in placements(board, board.falling.shape, tops):
+            moves = placement_moves(board, placement)
+            if moves is not None:
+                found.append((moves, placement,
+                              place_rows(rows, placement, board.width)))
+
+        if self.model is not None and found:
+            scores = self.model.evaluate_batch(
+                [landed for moves, placement, (landed, cleared) in found],
+                [cleared for moves, placement, (landed, cleared) in found],
+                board.width
+            ).tolist()
+        else:
+            evaluator = self.evaluator or Evaluator()
+            scores = [evaluator.evaluate_rows(landed, board.width)
+                      for moves, placement, (landed, cleared) in found]
+
+        return [(score, moves, placement)
+                for score, (moves, placement, landed) in zip(scores, found)]
+
+    def drop_candidates(self, board):
+        """
+        Returns the (score, moves) tuples of scored_placements, like
+        candidates() does.
+        """
+
+        return [(score, moves) for score, moves, placement
+                in self.scored_placements(board, column_tops(board))]
+
+    def choose_drop(self, board):
+        """
+        Returns the moves to the best placement found by the drop search,
+        or remembered by the cache, or None if there is none.
+        """
+
+        tops = column_tops(board)
+        if self.cache is not None:
+            moves = self.cache.lookup(board, tops)
+            if moves is not None:
+                return moves
+
+        scored = self.scored_placements(board, tops)
+        if not scored:
+            return None
+        # max() picks the first of equally scored candidates.
+        score, moves, placement = max(scored,
+                                      key=lambda candidate: candidate[0])
+        if self.cache is not None:
+            self.cache.store(board, tops, placement)
+        return moves
 
+    def choose_action(self, board):
+        if self.search == 'drop':
+            moves = self.choose_drop(board)
+            if moves is not None:
+                return moves
+        # max() picks the first of equally scored candidates.
+        bestscore, bestmoves = max(self.candidates(board),
+                                   key=lambda candidate: candidate[0])
         return bestmoves
 
     
 
 class testBoard():
-    def __init__(self, board, initScore, initFalling):
+    def __init__(self, board, initScore, initFalling, weights=DEFAULT_WEIGHTS,
+                 evaluator=None):
         self.board = board # board.clone()
         self.cells = board.cells
         self.initScore = initScore
         self.initFalling = initFalling
+        self.weights = weights
+        self.evaluator = evaluator
     
     def move_to_target(self, rt, tx):
         moveList = []
@@ -105,26 +219,23 @@ class testBoard():
         return score, moveList
     
     def get_heights(self):
-        heightList = []
-        maxY = 24
-        for x in range(self.board.width):    
-            for y in range(self.board.height):
-                if (x,y) in self.board.cells:
-                    maxY = y
-                    break
-            heightList.append(24-maxY)
+        heightList = [0] * self.board.width
+        for (x, y) in self.board.cells:
+            height = self.board.height - y
+            if height > heightList[x]:
+                heightList[x] = height
+        # An empty column takes the height of the column to its left.
+        for x in range(1, self.board.width):
+            if heightList[x] == 0:
+                heightList[x] = heightList[x-1]
         return heightList
 
     # count the number of holes
     def get_holes(self):
-        countholes = set(())
+        # Every cell of a column is at or below its top, so whatever else
+        # lies below the top is a hole.
         heightList = self.get_heights()
-        for x in range(0,self.board.width):
-            for y in (range(24-heightList[x], 24)):
-                if (x, y) not in self.board.cells:
-                    countholes.add((x,y))
-                # print("countholes", countholes)
-        holes = len(countholes)
+        holes = sum(heightList) - len(self.board.cells)
         return holes
 
     
@@ -155,14 +266,17 @@ class testBoard():
         
     def fill_FourRows(self):
         fourRows= set([])
-        for i in range(0, 10):
+        for i in range(0, self.board.width):
             for j in range(1, 4):
-                if (i, 24-j) in self.cells:
-                    fourRows.add((i, 24-j))
+                if (i, self.board.height-j) in self.cells:
+                    fourRows.add((i, self.board.height-j))
         getfourRows = len(fourRows)
         return getfourRows
     
     def scoreBoard(self, tx):
+        if self.evaluator is not None:
+            return self.evaluator.evaluate(self.board)
+
         # tx = 0-8, higher score
         xscore = 0
         if tx in range(9):
@@ -176,14 +290,15 @@ class testBoard():
         getfourRows = self.fill_FourRows()
 
         # #least number of holes, weighing more on holes get higher score
+        weights = self.weights
         score = 0
-        score -= holes * 1000
+        score += holes * weights['holes']
         # score -= sum(heightList) 
-        score -= bumpiness *100
-        score += getfourRows 
+        score += bumpiness * weights['bumpiness']
+        score += getfourRows * weights['four_rows']
         # score += xscore
         if (self.initFalling.shape == Shape.I):
-             score += 90000 * self.remove_FourRows()
+             score += weights['tetris'] * self.remove_FourRows()
         return score
     
 SelectedPlayer = myPlayer
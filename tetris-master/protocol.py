@@ -0,0 +1,175 @@
+from sys import stdin, stdout
+
+from board import Action, Direction, Rotation
+from constants import PREFIX
+from exceptions import UnknownInstructionException
+
+# Protocol extensions, negotiated by the player sending HELLO followed by
+# the extensions it would like to use; the game replies with HELLO and the
+# subset it supports.
+HELLO = 'HELLO'
+# Sends all actions for a block, up to and including the one that lands it,
+# as a single message.
+BATCH = 'BATCH'
+# Plays many games over one connection. Every message after HELLO is tagged
+# with @ and the id of its game; the player starts a game with START.
+MUX = 'MUX'
+START = 'START'
+# Announces the next shapes several at a time, asked for as PREVIEW:<count>.
+# The game then sends PREVIEW followed by up to count shapes whenever the
+# previously announced shapes have all been used, instead of one shape per
+# turn.
+PREVIEW = 'PREVIEW'
+# Most shapes announced at once in PREVIEW mode; larger counts are lowered
+# to this.
+MAX_PREVIEW = 64
+
+EXTENSIONS = {BATCH, PREVIEW}
+
+
+# Translates wire tokens to player actions.
+TOKENS = {
+    'SKIP': None,
+    **{direction.value: direction for direction in Direction},
+    **{rotation.value: rotation for rotation in Rotation},
+    **{action.value: action for action in Action},
+}
+
+PREFIX_BYTES = PREFIX.encode()
+
+
+def parse_action(token):
+    """
+    Turns a token sent over the wire into a player action.
+    """
+
+    try:
+        return TOKENS[token]
+    except KeyError:
+        raise UnknownInstructionException
+
+
+def parse_actions(instruction):
+    """
+    Parses an instruction, without its prefix, into the list of actions it
+    holds.
+    """
+
+    if instruction.startswith(BATCH):
+        return [parse_action(token) for token in instruction.split()[1:]]
+    return [parse_action(instruction)]
+
+
+def preview_count(option):
+    """
+    Returns the number of shapes to announce at a time for the option of a
+    PREVIEW request, at most MAX_PREVIEW, or None unless it is a positive
+    number.
+    """
+
+    if not (option.isascii() and option.isdigit()) or int(option) == 0:
+        return None
+    return min(int(option), MAX_PREVIEW)
+
+
+def hello_reply(instruction, supported=EXTENSIONS):
+    """
+    Replies to a HELLO instruction, agreeing to the extensions we support.
+    PREVIEW is agreed to with the count it will be served with, or declined
+    if the count asked for is not valid.
+    """
+
+    extensions = []
+    for extension in instruction.split()[1:]:
+        name, _, option = extension.partition(':')
+        if name not in supported:
+            continue
+        if name == PREVIEW:
+            count = preview_count(option)
+            if count is None:
+                continue
+            extension = f'{PREVIEW}:{count}'
+        extensions.append(extension)
+    return f'{HELLO} ' + ' '.join(extensions)
+
+
+def extension_options(reply):
+    """
+    Maps the extensions agreed to in a HELLO reply to their options.
+    """
+
+    extensions = {}
+    for extension in reply.split()[1:]:
+        name, _, option = extension.partition(':')
+        extensions[name] = option
+    return extensions
+
+
+def format_action(action):
+    if action is None:
+        return 'SKIP'
+    return action.value
+
+
+def format_batch(actions):
+    return f'{BATCH} ' + ' '.join(map(format_action, actions))
+
+
+class Channel:
+    """
+    Exchanges messages over binary buffered streams, standard input and
+    output by default. Messages written are only flushed once we are about
+    to wait for the other side, so a whole turn goes out in one write.
+    """
+
+    def __init__(self, input=None, output=None):
+        self.input = input or stdin.buffer
+        self.output = output or stdout.buffer
+
+    def send(self, message):
+        self.output.write(b'%s %s\n' % (PREFIX_BYTES, message.encode()))
+
+    def flush(self):
+        self.output.flush()
+
+    def close(self):
+        self.flush()
+
+    def receive(self):
+        """
+        Flushes what was sent and waits for the next message, which is
+        returned without its prefix. Returns None once the input is closed.
+        """
+
+        self.output.flush()
+        while True:
+            line = self.input.readline()
+            if not line:
+                return None
+            if line.startswith(PREFIX_BYTES):
+                return line[len(PREFIX_BYTES)+1:].strip().decode()
+
+
+class Outbox:
+    """
+    Sends the actions of the player. Once the game has agreed to batching,
+    actions are held back until flush is called, when the block has landed,
+    and sent as a single message.
+    """
+
+    batch = False
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.pending = []
+
+    def send(self, action):
+        if self.batch:
+            self.pending.append(action)
+        else:
+            self.channel.send(format_action(action))
+
+    def flush(self):
+        if self.pending:
+            self.channel.send(format_batch(self.pending))
+            self.pending = []
@@ -0,0 +1,307 @@
+import mmap
+import struct
+import sys
+from bisect import bisect_right
+
+from board import Board, Block, Action, Direction, Rotation, Shape, \
+    shape_to_color, action_function
+from constants import BOARD_HEIGHT, BOARD_WIDTH
+
+# Every move yielded by Board.run is stored as a single byte: the index of
+# the move in this list.
+EVENTS = list(Shape) + list(Direction) + list(Rotation) + list(Action) + [None]
+EVENT_CODES = {event: code for code, event in enumerate(EVENTS)}
+
+# Cell colours are stored as the index of the shape they belong to.
+COLORS = list(shape_to_color.values())
+COLOR_CODES = {color: code for code, color in enumerate(COLORS)}
+
+NO_SHAPE = 0xFF
+
+MAGIC = b'TRPA'
+VERSION = 1
+CHECKPOINT_INTERVAL = 64
+
+HEADER = struct.Struct('<4sHHHIQ')
+INDEX_ENTRY = struct.Struct('<QIQIq')
+CHECKPOINT_ENTRY = struct.Struct('<IQI')
+
+BOARD_HEADER = struct.Struct('<HHqBBI')
+CELL = struct.Struct('<HHB')
+FALLING = struct.Struct('<BBdd')
+FALLING_CELL = struct.Struct('<hh')
+
+
+def encode_board(board):
+    """
+    Serializes the cells, colours, score, counters and blocks of a board
+    into a compact byte string.
+    """
+
+    parts = [BOARD_HEADER.pack(board.width, board.height, board.score,
+                               board.bombs_remaining,
+                               board.discards_remaining,
+                               len(board.cells))]
+    parts.extend(
+        CELL.pack(x, y, COLOR_CODES[board.cellcolor[x, y]])
+        for (x, y) in board.cells
+    )
+
+    falling = board.falling
+    if falling is None:
+        parts.append(FALLING.pack(NO_SHAPE, 0, 0, 0))
+    else:
+        parts.append(FALLING.pack(EVENT_CODES[falling.shape],
+                                  len(falling.cells), *falling.center))
+        parts.extend(FALLING_CELL.pack(x, y) for (x, y) in falling)
+
+    if board.next is None:
+        parts.append(bytes([NO_SHAPE]))
+    else:
+        parts.append(bytes([EVENT_CODES[board.next.shape]]))
+
+    return b''.join(parts)
+
+
+def decode_board(data, offset=0):
+    """
+    Rebuilds a board from the output of encode_board.
+    """
+
+    width, height, score, bombs, discards, count = \
+        BOARD_HEADER.unpack_from(data, offset)
+    offset += BOARD_HEADER.size
+
+    board = Board(width, height, score, discards, bombs)
+    for _ in range(count):
+        x, y, color = CELL.unpack_from(data, offset)
+        offset += CELL.size
+        board.cells.add((x, y))
+        board.cellcolor[x, y] = COLORS[color]
+
+    shape, count, cx, cy = FALLING.unpack_from(data, offset)
+    offset += FALLING.size
+    if shape != NO_SHAPE:
+        board.falling = Block(EVENTS[shape])
+        board.falling.cells = {
+            FALLING_CELL.unpack_from(data, offset + i*FALLING_CELL.size)
+            for i in range(count)
+        }
+        board.falling.center = cx, cy
+        offset += count * FALLING_CELL.size
+
+    if data[offset] != NO_SHAPE:
+        board.next = Block(EVENTS[data[offset]])
+
+    return board
+
+
+def apply_event(board, event, first=False):
+    """
+    Applies a move as yielded by Board.run to the board. The first shape of
+    a game is placed on the board straight away, like Board.run does.
+    """
+
+    if isinstance(event, Shape):
+        board.next = Block(event)
+        if first:
+            board.place_next_block()
+    else:
+        action_function(event)(board, event)
+
+
+class Recorder:
+    """
+    Records the moves of a game as it is played, as one byte per move.
+    """
+
+    events = None
+
+    def __init__(self):
+        self.events = bytearray()
+
+    def record(self, moves):
+        """
+        Passes through the moves yielded by Board.run while recording them.
+        """
+
+        for move in moves:
+            self.events.append(EVENT_CODES[move])
+            yield move
+
+
+class ArchiveWriter:
+    """
+    Packs many recorded games into a single archive file. Every game stores
+    its moves along with a snapshot of the board every `interval` moves, so
+    that any position can be reconstructed without replaying the whole game.
+    """
+
+    def __init__(self, path, width=BOARD_WIDTH, height=BOARD_HEIGHT,
+                 interval=CHECKPOINT_INTERVAL):
+        self.file = open(path, 'wb')
+        self.width = width
+        self.height = height
+        self.interval = interval
+        self.index = []
+        self.file.write(bytes(HEADER.size))
+
+    def add(self, events, score):
+        """
+        Appends a game, given the bytes produced by a Recorder and its final
+        score.
+        """
+
+        events = bytes(events)
+        events_offset = self.file.tell()
+        self.file.write(events)
+
+        # Replay the game to take the checkpoints.
+        checkpoints = []
+        board = Board(self.width, self.height)
+        for position, code in enumerate(events, 1):
+            apply_event(board, EVENTS[code], position == 1)
+            if position % self.interval == 0:
+                data = encode_board(board)
+                checkpoints.append((position, self.file.tell(), len(data)))
+                self.file.write(data)
+
+        table_offset = self.file.tell()
+        for checkpoint in checkpoints:
+            self.file.write(CHECKPOINT_ENTRY.pack(*checkpoint))
+
+        self.index.append((events_offset, len(events), table_offset,
+                           len(checkpoints), score))
+
+    def close(self):
+        index_offset = self.file.tell()
+        for entry in self.index:
+            self.file.write(INDEX_ENTRY.pack(*entry))
+
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.width, self.height,
+                                    len(self.index), index_offset))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Archive:
+    """
+    Memory-mapped read access to an archive written by ArchiveWriter.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.width, self.height, self.games, index_offset = \
+            HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a replay archive')
+        self.index_offset = index_offset
+
+    def __len__(self):
+        return self.games
+
+    def close(self):
+        self.data.close()
+
+    def entry(self, game):
+        if not 0 <= game < self.games:
+            raise IndexError(game)
+        return INDEX_ENTRY.unpack_from(
+            self.data, self.index_offset + game*INDEX_ENTRY.size)
+
+    def score(self, game):
+        return self.entry(game)[4]
+
+    def events(self, game):
+        """
+        Returns the moves of a game, in the order they were played.
+        """
+
+        offset, length, _, _, _ = self.entry(game)
+        return [EVENTS[code] for code in self.data[offset:offset+length]]
+
+    def board_at(self, game, move):
+        """
+        Reconstructs the board of the given game after its first `move`
+        moves, starting from the closest checkpoint.
+        """
+
+        offset, length, table, count, _ = self.entry(game)
+        if not 0 <= move <= length:
+            raise IndexError(move)
+
+        positions = [
+            CHECKPOINT_ENTRY.unpack_from(
+                self.data, table + i*CHECKPOINT_ENTRY.size)[0]
+            for i in range(count)
+        ]
+        i = bisect_right(positions, move)
+        if i == 0:
+            position = 0
+            board = Board(self.width, self.height)
+        else:
+            position, blob, _ = CHECKPOINT_ENTRY.unpack_from(
+                self.data, table + (i-1)*CHECKPOINT_ENTRY.size)
+            board = decode_board(self.data, blob)
+
+        for code in self.data[offset+position:offset+move]:
+            position += 1
+            apply_event(board, EVENTS[code], position == 1)
+        return board
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def pack(output, inputs):
+    """
+    Combines the games of several archives into a single archive. The
+    archives must all hold games played on boards of the same size; this is
+    checked before anything is written.
+    """
+
+    size = None
+    for path in inputs:
+        with Archive(path) as archive:
+            if size is None:
+                size = archive.width, archive.height
+            elif (archive.width, archive.height) != size:
+                raise ValueError(
+                    f'{path} holds games on {archive.width}x{archive.height} '
+                    f'boards, not {size[0]}x{size[1]}')
+
+    writer = None
+    for path in inputs:
+        with Archive(path) as archive:
+            if writer is None:
+                writer = ArchiveWriter(output, archive.width, archive.height)
+            for game in range(len(archive)):
+                offset, length, _, _, score = archive.entry(game)
+                writer.add(archive.data[offset:offset+length], score)
+    if writer is not None:
+        writer.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 3 and sys.argv[1] == 'pack':
+        pack(sys.argv[2], sys.argv[3:])
+    elif len(sys.argv) == 5 and sys.argv[1] == 'show':
+        with Archive(sys.argv[2]) as archive:
+            board = archive.board_at(int(sys.argv[3]), int(sys.argv[4]))
+            print(board)
+            print('Score:', board.score)
+    else:
+        print(f'usage: {sys.argv[0]} pack OUTPUT INPUT...')
+        print(f'       {sys.argv[0]} show ARCHIVE GAME MOVE')
+        raise SystemExit(1)
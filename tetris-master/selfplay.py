@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from adversary import RandomAdversary
+from board import Board, Shape
+from constants import BOARD_HEIGHT, BOARD_WIDTH, BLOCK_LIMIT
+from exceptions import BlockLimitException
+from player import Player, SelectedPlayer
+from sequences import SequenceBank
+
+parser = argparse.ArgumentParser(
+    description='Generate a self-play dataset of player decisions'
+)
+parser.add_argument('output', help='Directory to write the dataset to')
+parser.add_argument('--games', type=int, default=100)
+parser.add_argument('--capacity', type=int, default=1_000_000,
+                    help='Number of decision records to preallocate')
+parser.add_argument('--blocks', type=int, default=BLOCK_LIMIT)
+parser.add_argument('--seed', type=int, default=0,
+                    help='Seed of the first game; game n uses seed+n')
+parser.add_argument('--sequences', metavar='BANK', default=None,
+                    help='Deal shapes from a bank written by sequences.py')
+
+SHAPE_CODES = {shape: code for code, shape in enumerate(Shape)}
+NO_SHAPE = 0xFF
+
+
+class DatasetFullException(Exception):
+    pass
+
+
+def record_dtype(width, height):
+    """
+    Layout of a single decision record for boards of the given size.
+    """
+
+    return np.dtype([
+        # Occupied cells, row by row, packed eight to a byte.
+        ('board', np.uint8, ((width*height + 7) // 8,)),
+        ('current', np.uint8),
+        ('next', np.uint8),
+        ('rotation', np.uint8),
+        ('column', np.uint16),
+        # Score of every (column, rotation) candidate the player considered.
+        ('scores', np.float32, (width*4,)),
+        ('game', np.uint32),
+        # Final score of the game the decision was made in.
+        ('outcome', np.int64),
+    ])
+
+
+class Dataset:
+    """
+    Writes decision records to a preallocated, memory-mapped .npy file, and
+    keeps a small JSON file with the number of records written so far.
+    """
+
+    def __init__(self, path, capacity, width=BOARD_WIDTH,
+                 height=BOARD_HEIGHT):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.width = width
+        self.height = height
+        self.records = open_memmap(os.path.join(path, 'records.npy'),
+                                   mode='w+', shape=(capacity,),
+                                   dtype=record_dtype(width, height))
+        self.cells = np.zeros((height, width), dtype=bool)
+        self.count = 0
+        self.games = 0
+        self.game_start = 0
+        # The dataset can be loaded, empty, even if no game ever finishes.
+        self.write_meta()
+
+    @property
+    def full(self):
+        return self.count == len(self.records)
+
+    def append(self, board, choice, scores):
+        """
+        Adds the decision made on the board: the index of the chosen
+        candidate and the scores of all candidates.
+        """
+
+        if self.full:
+            raise DatasetFullException()
+
+        self.cells[:] = False
+        for (x, y) in board.cells:
+            self.cells[y, x] = True
+
+        record = self.records[self.count]
+        record['board'] = np.packbits(self.cells)
+        record['current'] = SHAPE_CODES[board.falling.shape]
+        record['next'] = NO_SHAPE if board.next is None \
+            else SHAPE_CODES[board.next.shape]
+        record['column'], record['rotation'] = divmod(choice, 4)
+        record['scores'] = scores
+        record['game'] = self.games
+        self.count += 1
+
+    def discard_game(self):
+        """
+        Drops the records of the game being played, which did not get to
+        finish and so has no outcome.
+        """
+
+        self.count = self.game_start
+
+    def end_game(self, score):
+        """
+        Fills in the outcome of the records of the game that just ended.
+        """
+
+        self.records['outcome'][self.game_start:self.count] = score
+        self.records.flush()
+        self.games += 1
+        self.game_start = self.count
+        self.write_meta()
+
+    def write_meta(self):
+        meta = {
+            'records': self.count,
+            'games': self.games,
+            'width': self.width,
+            'height': self.height,
+        }
+        tmp = os.path.join(self.path, 'meta.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(self.path, 'meta.json'))
+
+
+def load(path):
+    """
+    Returns the records of a dataset as a read-only memory-mapped array.
+    """
+
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    records = np.load(os.path.join(path, 'records.npy'), mmap_mode='r')
+    return records[:meta['records']]
+
+
+def unpack_board(record, width=BOARD_WIDTH, height=BOARD_HEIGHT):
+    """
+    Turns the packed board of a record back into a height x width array.
+    """
+
+    bits = np.unpackbits(record['board'], count=width*height)
+    return bits.reshape(height, width).astype(bool)
+
+
+class RecordingPlayer(Player):
+    """
+    Plays like the given player, recording each decision in a dataset.
+    """
+
+    def __init__(self, player, dataset):
+        self.player = player
+        self.dataset = dataset
+
+    def choose_action(self, board):
+        candidates = self.player.candidates(board)
+        scores = [score for score, moves in candidates]
+        choice = max(range(len(scores)), key=scores.__getitem__)
+        self.dataset.append(board, choice, scores)
+        return candidates[choice][1]
+
+
+def run(args):
+    dataset = Dataset(args.output, args.capacity)
+    player = RecordingPlayer(SelectedPlayer(), dataset)
+    bank = SequenceBank(args.sequences) if args.sequences else None
+
+    for game in range(args.games):
+        board = Board(BOARD_WIDTH, BOARD_HEIGHT)
+        if bank is not None:
+            adversary = bank.adversary(args.seed + game, args.blocks)
+        else:
+            adversary = RandomAdversary(args.seed + game, args.blocks)
+        try:
+            for move in board.run(player, adversary):
+                pass
+        except BlockLimitException:
+            pass
+        except DatasetFullException:
+            dataset.discard_game()
+            print(f'Dataset is full; game {game} left out')
+            break
+        dataset.end_game(board.score)
+        print(f'Game {game}: score {board.score}, '
+              f'{dataset.count} records')
+
+        if dataset.full:
+            print('Dataset is full')
+            break
+
+
+if __name__ == '__main__':
+    run(parser.parse_args())
@@ -0,0 +1,136 @@
+import argparse
+from random import Random
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from adversary import Adversary, SHAPES
+from constants import BLOCK_LIMIT
+from exceptions import BlockLimitException
+
+parser = argparse.ArgumentParser(
+    description='Generate a bank of shape sequences shared by many games'
+)
+parser.add_argument('output', help='File to write the bank to (.npy)')
+parser.add_argument('--seeds', type=int, default=10000,
+                    help='Number of seeds in the bank')
+parser.add_argument('--seed', type=int, default=0,
+                    help='First seed of the bank; row n holds seed+n')
+parser.add_argument('--blocks', type=int, default=BLOCK_LIMIT,
+                    help='Number of shapes per sequence')
+parser.add_argument('--bag', default=False, action='store_true',
+                    help='Deal the shapes from shuffled bags of seven')
+
+# Random.choice(SHAPES) takes the top three bits of a 32-bit word from the
+# generator, drawing again when they do not name a shape.
+SHAPE_BITS = 3
+
+
+def bank_dtype(count):
+    return np.dtype([
+        ('seed', np.int64),
+        # Indices into SHAPES.
+        ('shapes', np.uint8, (count,)),
+    ])
+
+
+def generate_sequence(seed, count, bag=False):
+    """
+    Returns the first count shapes chosen by a RandomAdversary with the
+    given seed, as indices into SHAPES. Random words are drawn from the
+    generator in bulk rather than once per shape, which gives the same
+    sequence. In bag mode, every seven shapes are instead a shuffled set
+    of all of them.
+    """
+
+    random = Random(seed)
+    if bag:
+        sequence = []
+        while len(sequence) < count:
+            shapes = list(range(len(SHAPES)))
+            random.shuffle(shapes)
+            sequence.extend(shapes)
+        return np.array(sequence[:count], dtype=np.uint8)
+
+    parts = [np.zeros(0, dtype=np.uint8)]
+    remaining = count
+    while remaining > 0:
+        # One in eight draws is rejected; ask for a few more than needed.
+        words = remaining + remaining // 7 + 8
+        # getrandbits puts the first word in the lowest bits.
+        data = random.getrandbits(32 * words).to_bytes(4 * words, 'little')
+        codes = np.frombuffer(data, dtype='<u4') >> (32 - SHAPE_BITS)
+        codes = codes[codes < len(SHAPES)].astype(np.uint8)
+        parts.append(codes[:remaining])
+        remaining -= len(parts[-1])
+    return np.concatenate(parts)
+
+
+class SequenceAdversary(Adversary):
+    """
+    Deals the shapes of a pre-generated sequence, in order. The game is won
+    once the sequence runs out.
+    """
+
+    def __init__(self, sequence):
+        self.sequence = sequence
+        self.position = 0
+
+    def choose_block(self, board):
+        if self.position == len(self.sequence):
+            raise BlockLimitException()
+        shape = SHAPES[self.sequence[self.position]]
+        self.position += 1
+        return shape
+
+
+def create_bank(path, first_seed, seeds, count, bag=False):
+    """
+    Writes the sequences of seeds first_seed to first_seed+seeds-1 to a
+    memory-mapped .npy file.
+    """
+
+    bank = open_memmap(path, mode='w+', shape=(seeds,),
+                       dtype=bank_dtype(count))
+    for row in range(seeds):
+        bank['seed'][row] = first_seed + row
+        bank['shapes'][row] = generate_sequence(first_seed + row, count, bag)
+    bank.flush()
+
+
+class SequenceBank:
+    """
+    Read-only access to a bank written by create_bank. The file is memory
+    mapped, so processes reading the same bank share its pages instead of
+    generating or copying the sequences.
+    """
+
+    def __init__(self, path):
+        self.sequences = np.load(path, mmap_mode='r')
+        self.rows = {int(seed): row
+                     for row, seed in enumerate(self.sequences['seed'])}
+
+    def __contains__(self, seed):
+        return seed in self.rows
+
+    def sequence(self, seed):
+        return self.sequences['shapes'][self.rows[seed]]
+
+    def adversary(self, seed, blocks=None):
+        """
+        Returns an adversary dealing the shapes of the seed, stopping after
+        blocks shapes like RandomAdversary does.
+        """
+
+        sequence = self.sequence(seed)
+        if blocks is not None:
+            if blocks > len(sequence):
+                raise ValueError(f'the bank only holds {len(sequence)} '
+                                 f'shapes per seed')
+            sequence = sequence[:blocks]
+        return SequenceAdversary(sequence)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    create_bank(args.output, args.seed, args.seeds, args.blocks, args.bag)
@@ -1,22 +1,48 @@
 from adversary import Adversary
-from board import Board, Direction, Rotation, Action, Shape
-from constants import BOARD_HEIGHT, BOARD_WIDTH, PREFIX
+from board import Board, Shape
+from checkpoint import load
+from constants import BOARD_HEIGHT, BOARD_WIDTH
 from exceptions import UnknownInstructionException
 from player import SelectedPlayer
+from protocol import HELLO, BATCH, PREVIEW, Channel, Outbox, \
+    extension_options
+
+from collections import deque
+from os import getenv
+from sys import stderr
 
 
 class RemoteAdversary(Adversary):
+    def __init__(self, channel, outbox):
+        self.channel = channel
+        self.outbox = outbox
+        # Shapes announced ahead of time in PREVIEW mode.
+        self.upcoming = deque()
+
     def choose_block(self, board):
+        # The previous block has landed; send any actions held back for it.
+        self.outbox.flush()
+
+        if self.upcoming:
+            # No need to wait for the other side.
+            self.channel.flush()
+            return self.upcoming.popleft()
+
         while True:
-            try:
-                command = input().strip()
-            except EOFError:
+            command = self.channel.receive()
+            if command is None:
                 raise SystemExit
 
-            if command.startswith(PREFIX):
-                break
+            if command.startswith(HELLO):
+                # The other side agreed to these protocol extensions.
+                self.outbox.batch = BATCH in extension_options(command)
+                continue
+
+            if command.startswith(PREVIEW):
+                self.upcoming.extend(map(Shape, command.split()[1:]))
+                return self.upcoming.popleft()
 
-        command = command[len(PREFIX)+1:]
+            break
 
         if command == 'WON' or command == 'LOST':
             # Game ended; stop cleanly.
@@ -30,18 +56,49 @@ class RemoteAdversary(Adversary):
         raise UnknownInstructionException
 
 
-board = Board(BOARD_WIDTH, BOARD_HEIGHT)
+def main():
+    player = SelectedPlayer()
+    if getenv('SHM'):
+        # Talk to a game on the same host through shared memory.
+        from shm import ShmChannel
+        try:
+            channel = ShmChannel(getenv('SHM'), game=False)
+        except TimeoutError as error:
+            raise SystemExit(error)
+    else:
+        channel = Channel()
+    outbox = Outbox(channel)
+    adversary = RemoteAdversary(channel, outbox)
+
+    extensions = []
+    if getenv('BATCH'):
+        # Ask to send all actions for a block as a single message.
+        extensions.append(BATCH)
+    if getenv('PREVIEW'):
+        # Ask to be told this many shapes at a time.
+        extensions.append(f'{PREVIEW}:{int(getenv("PREVIEW"))}')
+    if extensions and getenv('SHM'):
+        # Shared memory only carries the basic protocol.
+        stderr.write('Protocol extensions are not available over shared '
+                     'memory; ignoring them\n')
+    elif extensions:
+        channel.send(f'{HELLO} ' + ' '.join(extensions))
+
+    if getenv('RESUME'):
+        # Continue the game saved by the other side.
+        board = load(getenv('RESUME'))
+        moves = board.resume(player, adversary)
+    else:
+        board = Board(BOARD_WIDTH, BOARD_HEIGHT)
+        moves = board.run(player, adversary)
+
+    try:
+        for move in moves:
+            if not isinstance(move, Shape):
+                outbox.send(move)
+    finally:
+        channel.close()
 
-player = SelectedPlayer()
-adversary = RemoteAdversary()
 
-for move in board.run(player, adversary):
-    if isinstance(move, Direction):
-        print(f'{PREFIX} {move.value}')
-    elif isinstance(move, Rotation):
-        print(f'{PREFIX} {move.value}')
-    elif isinstance(move, Action):
-        print(f'{PREFIX} {move.value}')
-    elif move is None:
-        print(f'{PREFIX} SKIP')
-        
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+import mmap
+import os
+import struct
+import tempfile
+from time import monotonic, sleep
+
+from board import Shape
+from protocol import TOKENS
+
+# Every message of the basic protocol travels as a single byte: its index in
+# this list.
+MESSAGES = [shape.value for shape in Shape] + list(TOKENS) + ['WON', 'LOST']
+MESSAGE_CODES = {message: code for code, message in enumerate(MESSAGES)}
+
+RING_SIZE = 4096
+# The head and tail of a ring, the process id of its producer, zero until
+# the producer attaches, and whether the producer has closed it.
+COUNTERS = struct.Struct('<QQQQ')
+RING_BYTES = COUNTERS.size + RING_SIZE
+# The memory starts with the process id of the game that created it, so
+# that memory left behind by a game that died can be told apart.
+HEADER = struct.Struct('<Q')
+MEMORY_BYTES = HEADER.size + 2 * RING_BYTES
+
+# Shared memory is a file in this directory, mapped by both sides.
+SHM_DIRECTORY = '/dev/shm' if os.path.isdir('/dev/shm') \
+    else tempfile.gettempdir()
+
+# Waiting for the other side first yields the processor this many times,
+# then sleeps between checks.
+SPINS = 1000
+IDLE = 50e-6
+# Seconds the player waits for the game to create the memory.
+ATTACH_TIMEOUT = 10
+
+
+class Ring:
+    """
+    A single-producer, single-consumer byte queue in shared memory. The
+    producer only ever advances the head and the consumer the tail, so no
+    lock is needed.
+    """
+
+    def __init__(self, buf, offset):
+        self.buf = buf
+        self.offset = offset
+        self.data = offset + COUNTERS.size
+
+    def counters(self):
+        return COUNTERS.unpack_from(self.buf, self.offset)[:2]
+
+    def set_producer(self, pid):
+        struct.pack_into('<Q', self.buf, self.offset + 16, pid)
+
+    def close(self):
+        struct.pack_into('<Q', self.buf, self.offset + 24, 1)
+
+    def wait(self, ready, alive):
+        """
+        Waits until ready() is true, returning False instead if alive()
+        turns false first.
+        """
+
+        spins = 0
+        while not ready():
+            if spins < SPINS:
+                spins += 1
+                os.sched_yield()
+            elif not alive():
+                # Nothing more is coming; see if anything came just before.
+                return ready()
+            else:
+                sleep(IDLE)
+        return True
+
+    def write(self, data, alive):
+        """
+        Writes all of data, unless the consumer goes away first. Returns
+        whether it did.
+        """
+
+        while data:
+            if not self.wait(lambda: self.counters()[0] - self.counters()[1]
+                             < RING_SIZE, alive):
+                return False
+            head, tail = self.counters()
+            start = head % RING_SIZE
+            count = min(len(data), RING_SIZE - (head - tail),
+                        RING_SIZE - start)
+            self.buf[self.data+start:self.data+start+count] = data[:count]
+            # Publish the bytes only once they are in place.
+            struct.pack_into('<Q', self.buf, self.offset, head + count)
+            data = data[count:]
+        return True
+
+    def read(self):
+        """
+        Waits for data and returns all of it, or b'' once the producer has
+        closed the ring or died without anything left to read.
+        """
+
+        if not self.wait(lambda: self.counters()[0] != self.counters()[1],
+                         self.producer_alive):
+            return b''
+        head, tail = self.counters()
+        start = tail % RING_SIZE
+        count = min(head - tail, RING_SIZE - start)
+        data = bytes(self.buf[self.data+start:self.data+start+count])
+        struct.pack_into('<Q', self.buf, self.offset + 8, tail + count)
+        return data
+
+    def producer_alive(self):
+        head, tail, pid, closed = COUNTERS.unpack_from(self.buf, self.offset)
+        if closed:
+            return False
+        # A producer that has not attached yet may still come.
+        return pid == 0 or process_alive(pid)
+
+
+def process_alive(pid):
+    if pid == 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Someone else's process, but it exists.
+        pass
+    return True
+
+
+class ShmChannel:
+    """
+    A drop-in replacement for protocol.Channel between processes on the same
+    host, exchanging one-byte messages over a pair of rings in shared
+    memory. The game creates the memory, replacing any left behind by a
+    game that died, and the player attaches to it, giving up after
+    ATTACH_TIMEOUT seconds. Only the basic protocol is supported, without
+    HELLO extensions.
+    receive() returns None once the other side has closed the channel or
+    died.
+    """
+
+    def __init__(self, name, game):
+        self.path = os.path.join(SHM_DIRECTORY, name)
+        if game:
+            fd = create(self.path)
+        else:
+            fd = attach(self.path)
+        try:
+            self.memory = mmap.mmap(fd, MEMORY_BYTES)
+        finally:
+            os.close(fd)
+
+        to_player = Ring(self.memory, HEADER.size)
+        to_game = Ring(self.memory, HEADER.size + RING_BYTES)
+        if game:
+            self.inbox, self.outbox = to_game, to_player
+        else:
+            self.inbox, self.outbox = to_player, to_game
+        self.game = game
+        self.outbox.set_producer(os.getpid())
+
+        self.pending = bytearray()
+        self.received = b''
+        self.closed = False
+
+    def send(self, message):
+        if message not in MESSAGE_CODES:
+            raise ValueError(f'{message!r} cannot be sent over shared '
+                             f'memory')
+        self.pending.append(MESSAGE_CODES[message])
+
+    def flush(self):
+        if self.pending:
+            # Whatever the other side will not read is dropped.
+            self.outbox.write(bytes(self.pending), self.inbox.producer_alive)
+            self.pending = bytearray()
+
+    def receive(self):
+        self.flush()
+        if not self.received:
+            self.received = self.inbox.read()
+            if not self.received:
+                return None
+        code, self.received = self.received[0], self.received[1:]
+        return MESSAGES[code]
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.flush()
+        # Tells the other side that nothing more is coming.
+        self.outbox.close()
+        self.memory.close()
+        if self.game:
+            os.unlink(self.path)
+
+
+def creator(fd):
+    return HEADER.unpack(os.pread(fd, HEADER.size, 0))[0]
+
+
+def create(path):
+    """
+    Creates the shared memory of a game at path. The memory is set up under
+    another name and linked into place, so that it never shows without its
+    header. Memory already there is replaced if the game that created it
+    is no longer running.
+    """
+
+    temporary = f'{path}.{os.getpid()}'
+    fd = os.open(temporary, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        os.ftruncate(fd, MEMORY_BYTES)
+        os.pwrite(fd, HEADER.pack(os.getpid()), 0)
+        while True:
+            try:
+                os.link(temporary, path)
+                return fd
+            except FileExistsError:
+                if not stale(path):
+                    raise
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+    except BaseException:
+        os.close(fd)
+        raise
+    finally:
+        os.unlink(temporary)
+
+
+def stale(path):
+    """
+    Checks whether the shared memory at path was left behind by a game that
+    is no longer running.
+    """
+
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        # Gone already.
+        return True
+    try:
+        return os.fstat(fd).st_size != MEMORY_BYTES \
+            or not process_alive(creator(fd))
+    finally:
+        os.close(fd)
+
+
+def attach(path, timeout=ATTACH_TIMEOUT):
+    """
+    Opens shared memory created by a running game, waiting up to timeout
+    seconds for it to be created if need be.
+    """
+
+    deadline = monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except FileNotFoundError:
+            pass
+        else:
+            # Memory left behind by a game that died is about to be
+            # replaced.
+            if os.fstat(fd).st_size == MEMORY_BYTES \
+               and process_alive(creator(fd)):
+                return fd
+            os.close(fd)
+        if monotonic() > deadline:
+            raise TimeoutError(f'no game has set up shared memory at {path}')
+        sleep(0.01)
@@ -0,0 +1,156 @@
+import asyncio
+import json
+
+from constants import PREFIX
+from events import BlockLanded, RowsCleared, BombExploded
+
+# Every this many frames, spectators get the whole board rather than what
+# changed.
+KEYFRAME_INTERVAL = 100
+# Frames queued for a spectator before further frames are dropped.
+FRAME_BACKLOG = 64
+
+
+def describe_block(block):
+    if block is None:
+        return None
+    return {'shape': block.shape.value, 'cells': sorted(block.cells)}
+
+
+class Spectator:
+    """
+    A connection watching a game. Frames are queued and written by the
+    spectator's own task, so a slow spectator only falls behind: once its
+    queue is full, frames are dropped and it is sent a keyframe as soon as
+    there is room again.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.queue = asyncio.Queue(FRAME_BACKLOG)
+        # Whether the spectator needs a keyframe to catch up.
+        self.stale = True
+
+    def send(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.stale = True
+
+    def close(self, message):
+        # Make room for the final message if need be.
+        while self.queue.qsize() >= FRAME_BACKLOG - 1:
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+        self.queue.put_nowait(None)
+
+    async def run(self):
+        while True:
+            message = await self.queue.get()
+            if message is None:
+                return
+            self.writer.write(message)
+            await self.writer.drain()
+
+
+class Broadcast:
+    """
+    Sends the changes of a game to its spectators. A frame lists the cells
+    of the block that landed, which are added first, and the rows cleared
+    afterwards, along with the falling and next blocks and the score.
+    Keyframes hold the whole board instead. The changes are taken from the
+    events of the board, which is only listened to while there are
+    spectators. Spectators added once the game is over are sent its result
+    straight away.
+    """
+
+    def __init__(self, board):
+        self.board = board
+        self.spectators = []
+        self.frames = 0
+        # The result of the game, once it is over.
+        self.result = None
+        self.forget_changes()
+
+    def add(self, spectator):
+        if self.result is not None:
+            spectator.close(self.ending())
+            return
+        if not self.spectators:
+            self.forget_changes()
+            self.board.subscribe(self.receive)
+        self.spectators.append(spectator)
+
+    def remove(self, spectator):
+        if spectator not in self.spectators:
+            return
+        self.spectators.remove(spectator)
+        if not self.spectators:
+            self.board.unsubscribe(self.receive)
+
+    def receive(self, event):
+        if isinstance(event, BlockLanded):
+            self.landed = [(x, y, event.color) for (x, y) in event.cells]
+        elif isinstance(event, RowsCleared):
+            self.cleared = list(event.rows)
+        elif isinstance(event, BombExploded):
+            self.exploded = True
+
+    def forget_changes(self):
+        self.landed = None
+        self.cleared = None
+        self.exploded = False
+
+    def frame(self):
+        board = self.board
+        return {
+            'frame': self.frames,
+            'score': board.score,
+            'falling': describe_block(board.falling),
+            'next': None if board.next is None else board.next.shape.value,
+        }
+
+    def keyframe(self):
+        board = self.board
+        frame = self.frame()
+        frame['cells'] = sorted(
+            (x, y, board.cellcolor[x, y]) for (x, y) in board.cells)
+        frame['bombs'] = board.bombs_remaining
+        frame['discards'] = board.discards_remaining
+        return f'{PREFIX} KEYFRAME {json.dumps(frame)}\n'.encode()
+
+    def delta(self):
+        frame = self.frame()
+        frame['added'] = self.landed or []
+        frame['cleared'] = self.cleared or []
+        return f'{PREFIX} FRAME {json.dumps(frame)}\n'.encode()
+
+    def publish(self):
+        """
+        Sends what changed since the previous frame to every spectator.
+        """
+
+        full = self.exploded or self.frames % KEYFRAME_INTERVAL == 0
+        keyframe = delta = None
+
+        for spectator in self.spectators:
+            if full or spectator.stale:
+                if keyframe is None:
+                    keyframe = self.keyframe()
+                spectator.stale = False
+                spectator.send(keyframe)
+            else:
+                if delta is None:
+                    delta = self.delta()
+                spectator.send(delta)
+
+        self.forget_changes()
+        self.frames += 1
+
+    def ending(self):
+        return f'{PREFIX} {self.result}\n'.encode()
+
+    def close(self, result):
+        self.result = result
+        for spectator in self.spectators:
+            spectator.close(self.ending())
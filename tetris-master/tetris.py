@@ -0,0 +1,56 @@
+import sys
+from importlib import import_module
+
+# The module and function running each backend. A module is only imported
+# once its backend is chosen, so that starting one never loads curses,
+# tkinter or pygame for another.
+BACKENDS = {
+    'curses': ('cmdline', 'main'),
+    'tk': ('visual', 'run'),
+    'pygame': ('visual-pygame', 'run'),
+    'headless': ('headless', 'main'),
+    # The player and the game host of the wire protocol, configured
+    # through the environment.
+    'server': ('server', 'main'),
+    'client': ('client', 'main'),
+}
+CONFIGURED_BY_ENVIRONMENT = {'server', 'client'}
+
+
+def make_parser():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Play Tetris with any of the front ends',
+        epilog='Arguments after the backend are passed on to it; '
+               'see "%(prog)s BACKEND --help".'
+    )
+    parser.add_argument('backend', choices=BACKENDS)
+    parser.add_argument('arguments', nargs=argparse.REMAINDER)
+    return parser
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    # argparse takes longer to import than the whole of server.py, so it is
+    # left to the backends that need it, unless the command line is wrong
+    # or help was asked for.
+    if not argv or argv[0] not in BACKENDS:
+        make_parser().parse_args(argv)
+    backend, arguments = argv[0], argv[1:]
+    if backend in CONFIGURED_BY_ENVIRONMENT and arguments:
+        make_parser().error(f'{backend} takes its settings from the '
+                            f'environment')
+
+    module, function = BACKENDS[backend]
+    run = getattr(import_module(module), function)
+    if backend in CONFIGURED_BY_ENVIRONMENT:
+        run()
+    else:
+        run(arguments)
+
+
+if __name__ == '__main__':
+    main()
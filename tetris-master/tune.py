@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+from multiprocessing import Pool
+from random import Random
+from statistics import mean, pstdev
+
+from adversary import RandomAdversary
+from board import Board
+from checkpoint import write_atomically
+from constants import BOARD_HEIGHT, BOARD_WIDTH
+from exceptions import BlockLimitException
+from player import DEFAULT_WEIGHTS, myPlayer, save_weights
+
+parser = argparse.ArgumentParser(
+    description='Tune the weights of the player with the cross-entropy method'
+)
+parser.add_argument('--generations', type=int, default=100)
+parser.add_argument('--population', type=int, default=24,
+                    help='Weight vectors evaluated per generation')
+parser.add_argument('--elite', type=int, default=6,
+                    help='Best weight vectors used to fit the next generation')
+parser.add_argument('--games', type=int, default=4,
+                    help='Games, on seeds shared by all candidates, per vector')
+parser.add_argument('--blocks', type=int, default=100,
+                    help='Block limit of every evaluation game')
+parser.add_argument('--workers', type=int, default=os.cpu_count())
+parser.add_argument('--seed', type=int, default=0)
+parser.add_argument('--checkpoint', default='tune-checkpoint.json',
+                    help='File the progress is saved to and resumed from')
+parser.add_argument('--output', default='weights.json',
+                    help='File the best weights are written to')
+
+# Settings of the player, read from the environment, under which it would
+# not score boards with the weights being tuned or would replay moves
+# chosen with other weights.
+OVERRIDES = ('EVALUATOR', 'MODEL', 'PLACEMENT_CACHE')
+
+
+def play(task):
+    """
+    Plays a single game with the given weights, returning the final score.
+    """
+
+    weights, seed, blocks = task
+    board = Board(BOARD_WIDTH, BOARD_HEIGHT)
+    adversary = RandomAdversary(seed, blocks)
+    # The move search is the one that scores boards with the weights.
+    player = myPlayer(weights=weights, search='moves')
+    try:
+        for move in board.run(player, adversary):
+            pass
+    except BlockLimitException:
+        pass
+    return board.score
+
+
+def initial_state(seed):
+    return {
+        'generation': 0,
+        'mean': dict(DEFAULT_WEIGHTS),
+        # Start with a spread proportional to the hand-set weights.
+        'std': {k: max(abs(v), 1) / 2 for k, v in DEFAULT_WEIGHTS.items()},
+        'best': dict(DEFAULT_WEIGHTS),
+        # The fitness of the best weights on the seeds of the latest
+        # generation.
+        'best_fitness': None,
+        'random': Random(seed).getstate(),
+    }
+
+
+def load_state(path):
+    with open(path) as f:
+        state = json.load(f)
+    # JSON turns the tuples of the random state into lists.
+    version, internal, gauss = state['random']
+    state['random'] = (version, tuple(internal), gauss)
+    return state
+
+
+def run(args):
+    if os.path.exists(args.checkpoint):
+        state = load_state(args.checkpoint)
+        print(f"Resuming at generation {state['generation']}")
+    else:
+        state = initial_state(args.seed)
+
+    random = Random()
+    random.setstate(state['random'])
+
+    with Pool(args.workers) as pool:
+        while state['generation'] < args.generations:
+            # All candidates of a generation play the same seeds, so that
+            # their scores only differ by the weights.
+            seeds = [random.getrandbits(32) for _ in range(args.games)]
+            population = [
+                {k: random.gauss(state['mean'][k], state['std'][k])
+                 for k in DEFAULT_WEIGHTS}
+                for _ in range(args.population)
+            ]
+
+            # The best weights so far play the same seeds again, so that
+            # they are compared with the candidates on equal terms rather
+            # than on the seeds of the generation they were found in.
+            tasks = [(weights, seed, args.blocks)
+                     for weights in population + [state['best']]
+                     for seed in seeds]
+            scores = pool.map(play, tasks)
+            fitness = [
+                mean(scores[i*args.games:(i+1)*args.games])
+                for i in range(args.population + 1)
+            ]
+            incumbent = fitness.pop()
+
+            ranked = sorted(range(args.population), key=lambda i: -fitness[i])
+            elite = [population[i] for i in ranked[:args.elite]]
+            state['mean'] = {k: mean(w[k] for w in elite)
+                             for k in DEFAULT_WEIGHTS}
+            state['std'] = {k: pstdev(w[k] for w in elite) + 1e-3
+                            for k in DEFAULT_WEIGHTS}
+
+            best = ranked[0]
+            if fitness[best] > incumbent:
+                state['best'] = population[best]
+                state['best_fitness'] = fitness[best]
+            else:
+                state['best_fitness'] = incumbent
+            save_weights(args.output, state['best'])
+
+            state['generation'] += 1
+            state['random'] = random.getstate()
+            write_atomically(args.checkpoint,
+                             json.dumps(state, indent=4).encode())
+
+            print(f"Generation {state['generation']}: "
+                  f"best {fitness[best]:.0f}, mean {mean(fitness):.0f}, "
+                  f"best so far {state['best_fitness']:.0f}")
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    overrides = [name for name in OVERRIDES if os.getenv(name)]
+    if overrides:
+        parser.error(f'{", ".join(overrides)} would keep the player from '
+                     f'using the weights being tuned; unset them first')
+    run(args)
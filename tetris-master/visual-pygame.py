@@ -1,9 +1,10 @@
 from adversary import RandomAdversary
 from arguments import parser
-from board import Board, Direction, Rotation, Action, Shape
-from constants import BOARD_WIDTH, BOARD_HEIGHT, DEFAULT_SEED, INTERVAL, \
-    BLOCK_LIMIT
+from board import Direction, Rotation, Action, Shape
+from checkpoint import start_game
+from constants import DEFAULT_SEED, INTERVAL, BLOCK_LIMIT
 from exceptions import BlockLimitException
+from pacing import Pacer, Simulation, SPEED_NAMES
 from player import Player, SelectedPlayer
 
 import pygame
@@ -22,100 +23,192 @@ EVENT_FORCE_DOWN = pygame.USEREVENT + 1
 FRAMES_PER_SECOND = 60
 
 
-class Block(pygame.sprite.Sprite):
-    def __init__(self, color, x, y, shape):
-        super().__init__()
+# Look of a cell holding a bomb, rather than a colour.
+BOMB = 'bomb'
+
+
+def make_tile(look):
+    """
+    Renders a single cell: a bomb, or a square of the given colour.
+    """
+
+    image = pygame.Surface([CELL_WIDTH, CELL_HEIGHT])
+    if look == BOMB:
+        pygame.draw.circle(image, WHITE, [CELL_WIDTH//2, CELL_HEIGHT//2],
+                           CELL_WIDTH/2)
+    else:
+        image.fill(pygame.Color(look))
+        pygame.draw.rect(image, WHITE, [0, 0, CELL_WIDTH, CELL_HEIGHT], width=1)
+    return image
+
+
+def make_discard():
+    image = pygame.Surface([CELL_WIDTH, CELL_HEIGHT])
+    pygame.draw.line(image, RED, (0, 0), (CELL_WIDTH, CELL_HEIGHT), width=3)
+    pygame.draw.line(image, RED, (0, CELL_HEIGHT), (CELL_WIDTH, 0), width=3)
+    return image
 
-        self.image = pygame.Surface([CELL_WIDTH, CELL_HEIGHT])
-        if shape is Shape.B:
-            pygame.draw.circle(self.image, WHITE, [CELL_WIDTH//2, CELL_HEIGHT//2],
-                               CELL_WIDTH/2)
-        else:
-            self.image.fill(color)
-            pygame.draw.rect(self.image, WHITE, [0, 0, CELL_WIDTH, CELL_HEIGHT], width=1)
-
-        self.rect = self.image.get_rect()
-        self.rect.x = x * CELL_WIDTH
-        self.rect.y = y * CELL_HEIGHT
-
-class Discard(pygame.sprite.Sprite):
-    def __init__(self, x, y):
-        super().__init__()
-
-        self.image = pygame.Surface([CELL_WIDTH, CELL_HEIGHT])
-        pygame.draw.line(self.image, RED, (0, 0), (CELL_WIDTH, CELL_HEIGHT), width=3)
-        pygame.draw.line(self.image, RED, (0, CELL_HEIGHT), (CELL_WIDTH, 0), width=3)
-
-        self.rect = self.image.get_rect()
-        self.rect.x = x * CELL_WIDTH
-        self.rect.y = y * CELL_HEIGHT
-
-txt = []
-def init_text(screen):
-    global txt, scorefont
-    font = pygame.font.SysFont(None, 24)
-    img = font.render('SCORE', True, WHITE)
-    txt.append((img, ((BOARD_WIDTH + 3)*CELL_WIDTH - img.get_rect().width//2, 0)))
-    img = font.render('NEXT', True, WHITE)
-    txt.append((img, ((BOARD_WIDTH + 3)*CELL_WIDTH - img.get_rect().width//2, CELL_HEIGHT*3)))
-    img = font.render('BOMBS', True, WHITE)
-    txt.append((img, ((BOARD_WIDTH + 3)*CELL_WIDTH - img.get_rect().width//2, CELL_HEIGHT*9)))
-    img = font.render('DISCARDS', True, WHITE)
-    txt.append((img, ((BOARD_WIDTH + 3)*CELL_WIDTH - img.get_rect().width//2, CELL_HEIGHT*12)))
-
-    scorefont = pygame.font.Font("Segment7-4Gml.otf", 40)
-
-def render(screen, board):
-    global scorefont, txt
-    screen.fill(BLACK)
-    for t,pos in txt:
-        screen.blit(t, pos)    
-
-    for i in range(0,10,2):
-        pygame.draw.rect(screen, GREY,
-                         [i * CELL_WIDTH, 0,
-                          CELL_WIDTH, board.height * CELL_HEIGHT])
-
-    img = scorefont.render(str(board.score), True, WHITE)
-    screen.blit(img, ((BOARD_WIDTH + 3)*CELL_WIDTH - img.get_rect().width//2, CELL_HEIGHT))
-
-    sprites = pygame.sprite.Group()
-
-    # Add the cells already on the board for drawing.
-    for (x, y) in board:
-        sprites.add(Block(pygame.Color(board.cellcolor[x, y]), x, y, Shape.O))
-
-    if board.falling is not None:
-        # Add the cells of the falling block for drawing.
-        for (x, y) in board.falling:
-            sprites.add(Block(pygame.Color(board.falling.color), x, y, board.falling.shape))
-
-    if board.next is not None:
-        # Add the cells of the next block for drawing.
-        width = board.next.right - board.next.left
-        for (x, y) in board.next:
-            sprites.add(
-                Block(pygame.Color(board.next.color),
-                      x + board.width + 2.5 - width/2, y+4,
-                      board.next.shape))
-
-    for i in range(board.bombs_remaining):
-        sprites.add(Block(pygame.Color(WHITE),board.width + 0.4 + i*1.1,10, Shape.B))
-
-    for i in range(board.discards_remaining):
-        sprites.add(Discard(board.width + 0.4 + (i%5)*1.1,13+(i//5)*1.1))
-        
-    sprites.draw(screen)
-
-    pygame.draw.line(
-        screen,
-        BLUE,
-        (board.width * CELL_WIDTH + 2, 0),
-        (board.width * CELL_WIDTH + 2, board.height * CELL_HEIGHT)
-    )
-
-    # Update window title with score.
-    pygame.display.set_caption(f'Score: {board.score}')
+
+class Renderer:
+    """
+    Keeps the window up to date with the board. Everything that never
+    changes is drawn once on a background layer, tiles are rendered once
+    per look, and every frame only redraws what changed, returning the
+    rectangles to pass to pygame.display.update.
+    """
+
+    def __init__(self, screen, board):
+        self.screen = screen
+        self.board = board
+        board.enable_snapshots()
+        self.tiles = {}
+        self.discard = make_discard()
+        self.scorefont = pygame.font.Font("Segment7-4Gml.otf", 40)
+
+        # What every cell currently shows, the version of the cells drawn
+        # and the cells of the falling block drawn over them, and what the
+        # side panel shows.
+        self.drawn = {}
+        self.cells_version = -1
+        self.falling = ()
+        self.score = None
+        self.next = None
+        self.bombs = None
+        self.discards = None
+        self.score_rect = pygame.Rect(0, 0, 0, 0)
+
+        self.background = self.draw_background()
+        screen.blit(self.background, (0, 0))
+        pygame.display.flip()
+
+        # Parts of the side panel that are redrawn as a whole.
+        panel = board.width * CELL_WIDTH + 3
+        panel_width = screen.get_width() - panel
+        self.next_rect = pygame.Rect(panel, CELL_HEIGHT*4,
+                                     panel_width, CELL_HEIGHT*4)
+        self.bombs_rect = pygame.Rect(panel, CELL_HEIGHT*10,
+                                      panel_width, CELL_HEIGHT)
+        self.discards_rect = pygame.Rect(panel, CELL_HEIGHT*13,
+                                         panel_width, CELL_HEIGHT*3)
+
+    def draw_background(self):
+        board = self.board
+        background = pygame.Surface(self.screen.get_size())
+        background.fill(BLACK)
+
+        for i in range(0,board.width,2):
+            pygame.draw.rect(background, GREY,
+                             [i * CELL_WIDTH, 0,
+                              CELL_WIDTH, board.height * CELL_HEIGHT])
+
+        font = pygame.font.SysFont(None, 24)
+        for text, row in [('SCORE', 0), ('NEXT', 3), ('BOMBS', 9),
+                          ('DISCARDS', 12)]:
+            img = font.render(text, True, WHITE)
+            background.blit(img, ((board.width + 3)*CELL_WIDTH
+                                  - img.get_rect().width//2,
+                                  CELL_HEIGHT*row))
+
+        pygame.draw.line(
+            background,
+            BLUE,
+            (board.width * CELL_WIDTH + 2, 0),
+            (board.width * CELL_WIDTH + 2, board.height * CELL_HEIGHT)
+        )
+        return background
+
+    def tile(self, look):
+        if look not in self.tiles:
+            self.tiles[look] = make_tile(look)
+        return self.tiles[look]
+
+    def clear(self, rect):
+        self.screen.blit(self.background, rect, rect)
+        return rect
+
+    def blit(self, image, x, y):
+        return self.screen.blit(image, (int(x * CELL_WIDTH),
+                                        int(y * CELL_HEIGHT)))
+
+    def render_cells(self, board, dirty):
+        # Only look at the rows that changed since the last frame, and at
+        # where the falling block was and is.
+        cells = set(self.falling)
+        for y in board.changed_rows(self.cells_version):
+            cells.update((x, y) for x in range(board.width))
+        falling = ()
+        if board.falling is not None:
+            falling = board.falling.cells
+            falling_look = BOMB if board.falling.shape is Shape.B \
+                else board.falling.color
+            cells |= falling
+
+        for (x, y) in cells:
+            look = falling_look if (x, y) in falling \
+                else board.cellcolor.get((x, y))
+            if self.drawn.get((x, y)) == look:
+                continue
+            if look is None:
+                dirty.append(self.clear(pygame.Rect(x * CELL_WIDTH,
+                                                    y * CELL_HEIGHT,
+                                                    CELL_WIDTH,
+                                                    CELL_HEIGHT)))
+            else:
+                dirty.append(self.blit(self.tile(look), x, y))
+            self.drawn[x, y] = look
+        self.cells_version = board.cells_version
+        self.falling = falling
+
+    def render_panel(self, board, dirty):
+
+        if board.score != self.score:
+            self.score = board.score
+            dirty.append(self.clear(self.score_rect))
+            img = self.scorefont.render(str(board.score), True, WHITE)
+            self.score_rect = self.screen.blit(
+                img, ((board.width + 3)*CELL_WIDTH
+                      - img.get_rect().width//2, CELL_HEIGHT))
+            dirty.append(self.score_rect)
+            # Update window title with score.
+            pygame.display.set_caption(f'Score: {board.score}')
+
+        shape = None if board.next is None else board.next.shape
+        if shape != self.next:
+            self.next = shape
+            dirty.append(self.clear(self.next_rect))
+            if board.next is not None:
+                width = board.next.right - board.next.left
+                look = BOMB if shape is Shape.B else board.next.color
+                for (x, y) in board.next:
+                    self.blit(self.tile(look),
+                              x + board.width + 2.5 - width/2, y+4)
+
+        if board.bombs_remaining != self.bombs:
+            self.bombs = board.bombs_remaining
+            dirty.append(self.clear(self.bombs_rect))
+            for i in range(board.bombs_remaining):
+                self.blit(self.tile(BOMB), board.width + 0.4 + i*1.1, 10)
+
+        if board.discards_remaining != self.discards:
+            self.discards = board.discards_remaining
+            dirty.append(self.clear(self.discards_rect))
+            for i in range(board.discards_remaining):
+                self.blit(self.discard, board.width + 0.4 + (i%5)*1.1,
+                          13+(i//5)*1.1)
+
+    def render(self):
+        """
+        Draws what changed since the last frame, returning the areas of the
+        screen that need updating.
+        """
+
+        dirty = []
+        # Draw the latest snapshot; the game may be played in another
+        # thread.
+        board = self.board.snapshot
+        self.render_cells(board, dirty)
+        self.render_panel(board, dirty)
+        return dirty
 
 
 class UserPlayer(Player):
@@ -149,48 +242,60 @@ class UserPlayer(Player):
                 return None
 
 
-def check_stop():
+def check_stop(pacer=None):
     for event in pygame.event.get():
         if event.type == pygame.KEYUP and event.key == pygame.K_ESCAPE:
             raise SystemExit
+        elif event.type == pygame.KEYUP and pacer is not None:
+            pacer.key(pygame.key.name(event.key))
         elif event.type == pygame.QUIT:
             raise SystemExit
 
 
-def run():
-    board = Board(BOARD_WIDTH, BOARD_HEIGHT)
+def run(argv=None):
+    args = parser.parse_args(argv)
+
     adversary = RandomAdversary(DEFAULT_SEED, BLOCK_LIMIT)
 
-    args = parser.parse_args()
     if args.manual:
         player = UserPlayer()
     else:
         player = SelectedPlayer()
 
+    board, moves = start_game(args, player, adversary)
+
     pygame.init()
 
     screen = pygame.display.set_mode([
-        (BOARD_WIDTH + 6) * CELL_WIDTH,
-        BOARD_HEIGHT * CELL_HEIGHT
+        (board.width + 6) * CELL_WIDTH,
+        board.height * CELL_HEIGHT
     ])
 
     clock = pygame.time.Clock()
 
-    init_text(screen)
+    renderer = Renderer(screen, board)
 
     # Set timer to force block down when no input is given.
     pygame.time.set_timer(EVENT_FORCE_DOWN, INTERVAL)
 
     try:
-        for move in board.run(player, adversary):
-            render(screen, board)
-            pygame.display.flip()
-
-            # If we are not playing manually, clear the events.
-            if not args.manual:
-                check_stop()
-
+        if args.manual:
+            for move in moves:
+                pygame.display.update(renderer.render())
+        else:
+            # The game is played in its own thread, a move per frame at
+            # normal speed; draw whatever the board looks like at every
+            # frame.
+            pacer = Pacer(1 / FRAMES_PER_SECOND, SPEED_NAMES[args.speed])
+            simulation = Simulation(moves, pacer)
+            simulation.start()
+            while simulation.is_alive():
+                check_stop(pacer)
+                pygame.display.update(renderer.render())
                 clock.tick(FRAMES_PER_SECOND)
+            pygame.display.update(renderer.render())
+            if simulation.out_of_blocks:
+                raise BlockLimitException()
 
         print("Score=", board.score)
         print("Press ESC in game window to exit")
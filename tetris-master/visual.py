@@ -1,17 +1,46 @@
+import json
+import os
 from threading import Condition, Thread
-from time import sleep
 from tkinter import Tk, Canvas, Frame, BOTH, TclError, font
 
 from adversary import RandomAdversary
 from arguments import parser
-from board import Board, Direction, Rotation, Action, Shape
-from constants import BOARD_HEIGHT, BOARD_WIDTH, DEFAULT_SEED, INTERVAL, \
-    BLOCK_LIMIT
+from board import Direction, Rotation, Action, Shape
+from checkpoint import start_game, write_atomically
+from constants import DEFAULT_SEED, INTERVAL, BLOCK_LIMIT
 from exceptions import BlockLimitException
+from pacing import Pacer, SPEED_NAMES
 from player import SelectedPlayer, Player
 
 DRAW_INTERVAL = 100
 
+# Font sizes found to fit the side panel, by font and display.
+FONT_CACHE = os.path.join(
+    os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+    'tetris-fonts.json'
+)
+
+
+# Look of a cell holding a bomb, rather than a colour.
+BOMB = 'bomb'
+
+
+def load_font_sizes():
+    try:
+        with open(FONT_CACHE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_font_sizes(sizes):
+    # Not being able to cache the sizes only makes the next start slower.
+    try:
+        os.makedirs(os.path.dirname(FONT_CACHE), exist_ok=True)
+        write_atomically(FONT_CACHE, json.dumps(sizes, indent=4).encode())
+    except OSError:
+        pass
+
 
 class Visual(Frame):
     board = None
@@ -19,6 +48,7 @@ class Visual(Frame):
     discards = None
     bombs = None
     score = None
+    next = None
 
     CELL_SIZE = 20
 
@@ -26,10 +56,11 @@ class Visual(Frame):
         super().__init__()
 
         self.board = board
+        board.enable_snapshots()
 
         self.master.geometry(
-            f'{(BOARD_WIDTH+6)*self.CELL_SIZE}x' +
-            f'{BOARD_HEIGHT*self.CELL_SIZE}'
+            f'{(board.width+6)*self.CELL_SIZE}x' +
+            f'{board.height*self.CELL_SIZE}'
         )
 
         self.pack(fill=BOTH, expand=1)
@@ -44,9 +75,15 @@ class Visual(Frame):
         self.bind("Control-c", self.quit)
 
         GREY = '#1e1e1e'
-        for i in range(0,10,2):
+        for i in range(0,board.width,2):
            self.canvas.create_rectangle(i * self.CELL_SIZE, 0, (i+1)*self.CELL_SIZE,
-                                         BOARD_HEIGHT * self.CELL_SIZE, fill=GREY) 
+                                         board.height * self.CELL_SIZE, fill=GREY) 
+
+        self.create_cells()
+
+        x = board.width * self.CELL_SIZE + 1
+        y = board.height * self.CELL_SIZE
+        self.canvas.create_line(x, 0, x, y, fill='blue')
 
         try:
             self.font = font.nametofont("Helvetica")
@@ -55,69 +92,125 @@ class Visual(Frame):
 
         # No easy way to predict what font we'll get - it differs
         # depending on the environment, so we'll just scale it until
-        # it's large enough.  This is ugly.
-        size = 10
-        width = 0
-        while width < 90:
-            size += 1
-            self.font.configure(size=size)
-            testtxt = self.canvas.create_text(0,-100, text="DISCARDS", font = self.font)
-            bounds = self.canvas.bbox(testtxt)
-            width = bounds[2] - bounds[0]
-            self.canvas.delete(testtxt)
-
+        # it's large enough.  This is ugly, and slow, so the sizes found
+        # are kept on disk for the next time.
+        sizes = load_font_sizes()
+        self.fit_font(self.font, "DISCARDS", 90, sizes)
         self.scorefont = font.nametofont("TkFixedFont")
-        size = 10
-        width = 0
-        while width < 100:
-            size += 1
-            self.scorefont.configure(size=size)
-            testtxt = self.canvas.create_text(0,-100, text="88888", font = self.scorefont)
-            bounds = self.canvas.bbox(testtxt)
-            width = bounds[2] - bounds[0]
-            self.canvas.delete(testtxt)
+        self.fit_font(self.scorefont, "88888", 100, sizes)
 
-        self.text = self.canvas.create_text((BOARD_WIDTH + 3)*self.CELL_SIZE, 0,
+        self.text = self.canvas.create_text((board.width + 3)*self.CELL_SIZE, 0,
                                             text="SCORE", font=self.font, anchor="n",
                                             fill="white")
 
-        self.scoretext = self.canvas.create_text((BOARD_WIDTH + 3)*self.CELL_SIZE,
+        self.scoretext = self.canvas.create_text((board.width + 3)*self.CELL_SIZE,
                                             self.CELL_SIZE-5,
                                             text=str(self.board.score),
                                             font=self.scorefont, anchor="n",
                                             fill="white", tag="score")
 
-        self.text = self.canvas.create_text((BOARD_WIDTH + 3)*self.CELL_SIZE,
+        self.text = self.canvas.create_text((board.width + 3)*self.CELL_SIZE,
                                             self.CELL_SIZE*3,
                                             text="NEXT", font=self.font, anchor="n",
                                             fill="white")
 
-        self.text = self.canvas.create_text((BOARD_WIDTH + 3)*self.CELL_SIZE,
+        self.text = self.canvas.create_text((board.width + 3)*self.CELL_SIZE,
                                             self.CELL_SIZE*9,
                                             text="BOMBS", font=self.font, anchor="n",
                                             fill="white")
 
-        self.text = self.canvas.create_text((BOARD_WIDTH + 3)*self.CELL_SIZE,
+        self.text = self.canvas.create_text((board.width + 3)*self.CELL_SIZE,
                                             self.CELL_SIZE*12,
                                             text="DISCARDS", font=self.font, anchor="n",
                                             fill="white")
 
-    def update_score(self):
-        if self.board.score == self.score:
+    def fit_font(self, face, text, width, sizes):
+        """
+        Grows the font until text is at least width pixels wide, unless
+        the size is already known for this font and display.
+        """
+
+        key = ' '.join([face.actual('family'),
+                        str(self.tk.call('tk', 'scaling')), text, str(width)])
+        if key in sizes:
+            face.configure(size=sizes[key])
+            return
+
+        size = 10
+        bounds = (0, 0, 0, 0)
+        while bounds[2] - bounds[0] < width:
+            size += 1
+            face.configure(size=size)
+            testtxt = self.canvas.create_text(0,-100, text=text, font=face)
+            bounds = self.canvas.bbox(testtxt)
+            self.canvas.delete(testtxt)
+
+        sizes[key] = size
+        save_font_sizes(sizes)
+
+    def update_score(self, board):
+        if board.score == self.score:
             return
-        self.score = self.board.score
-        self.canvas.itemconfig(self.scoretext, text=str(self.board.score))
-        self.master.title(f'Score: {self.board.score}')
+        self.score = board.score
+        self.canvas.itemconfig(self.scoretext, text=str(board.score))
+        self.master.title(f'Score: {board.score}')
         
     def quit(self, event):
         raise SystemExit
 
-    def draw_cell(self, x, y, color, shape):
+    def create_cells(self):
+        """
+        Sets up the cells of the board. A cell gets a square or a bomb the
+        first time it shows one, which is then hidden and shown again rather
+        than recreated. Frames only reconfigure the cells that changed.
+        """
+
+        # The square and the bomb of cells, by cell and kind.
+        self.cells = {}
+        # What every cell currently shows: a colour, BOMB or nothing.
+        self.drawn = {}
+        # The version of the cells drawn, and the cells of the falling
+        # block drawn over them.
+        self.cells_version = -1
+        self.falling = ()
+
+    def cell_item(self, cell, kind):
+        if (cell, kind) not in self.cells:
+            x, y = cell
+            left, top = x * self.CELL_SIZE, y * self.CELL_SIZE
+            right, bottom = left + self.CELL_SIZE, top + self.CELL_SIZE
+            if kind == BOMB:
+                item = self.canvas.create_oval(
+                    left, top, right, bottom, fill="white", state="hidden")
+            else:
+                item = self.canvas.create_rectangle(
+                    left, top, right, bottom, outline="white",
+                    state="hidden")
+            self.cells[cell, kind] = item
+        return self.cells[cell, kind]
+
+    def paint_cell(self, cell, look):
+        shown = self.drawn.get(cell)
+        if shown is not None:
+            kind = BOMB if shown == BOMB else 'square'
+            self.canvas.itemconfig(self.cell_item(cell, kind),
+                                   state="hidden")
+        if look == BOMB:
+            self.canvas.itemconfig(self.cell_item(cell, BOMB),
+                                   state="normal")
+        elif look is not None:
+            # tkinter's idea of green is rather dark
+            if look == 'green':
+                look = 'green2'
+            self.canvas.itemconfig(self.cell_item(cell, 'square'),
+                                   fill=look, state="normal")
+
+    def draw_cell(self, x, y, color, shape, tag):
         if shape is Shape.B:
             self.canvas.create_oval(
                 x * self.CELL_SIZE, y * self.CELL_SIZE,
                 (x+1) * self.CELL_SIZE, (y+1) * self.CELL_SIZE,
-                fill="white", tag="block")
+                fill="white", tag=tag)
         else:
             # tkinter's idea of green is rather dark
             if color == 'green':
@@ -125,7 +218,7 @@ class Visual(Frame):
             self.canvas.create_rectangle(
                 x * self.CELL_SIZE, y * self.CELL_SIZE,
                 (x+1) * self.CELL_SIZE, (y+1) * self.CELL_SIZE,
-                fill=color, outline="white", tag="block")
+                fill=color, outline="white", tag=tag)
 
     def draw_discard(self, x, y):
         x = x * self.CELL_SIZE
@@ -135,47 +228,68 @@ class Visual(Frame):
         self.canvas.create_line(x, y+self.CELL_SIZE, x+self.CELL_SIZE, y,
                                 fill="red", width=3, tag="discard")
 
-    def update_discards(self):
-        if self.board.discards_remaining == self.discards:
+    def update_discards(self, board):
+        if board.discards_remaining == self.discards:
             # don't redraw if the discards are unchanged
             return
-        self.discards = self.board.discards_remaining
+        self.discards = board.discards_remaining
         self.canvas.delete("discard")
-        for i in range(self.board.discards_remaining):
-            self.draw_discard(BOARD_WIDTH + 0.25 + (i%5)*1.1,13+(i//5)*1.1)
+        for i in range(board.discards_remaining):
+            self.draw_discard(board.width + 0.25 + (i%5)*1.1,13+(i//5)*1.1)
+
+    def update_bombs(self, board):
+        if board.bombs_remaining == self.bombs:
+            return
+        self.bombs = board.bombs_remaining
+        self.canvas.delete("bomb")
+        for i in range(board.bombs_remaining):
+            self.draw_cell(board.width + 0.25 + i*1.1, 10, "white",
+                           Shape.B, "bomb")
+
+    def update_next(self, next):
+        shape = None if next is None else next.shape
+        if shape == self.next:
+            return
+        self.next = shape
+        self.canvas.delete("next")
+        if next is not None:
+            # Draw the cells of the next block.
+            width = next.right - next.left
+            for (x, y) in next:
+                self.draw_cell(x + self.board.width + 2.5 - width/2, y+4,
+                               next.color, next.shape, "next")
 
     def draw(self):
-        with self.board.lock:
-            self.canvas.delete("block")
-            self.update_score()
-            self.update_discards()
-            
-            # Add the cells already on the board for drawing. 
-            for (x, y) in self.board:
-                self.draw_cell(x, y, self.board.cellcolor[x, y], Shape.O)
-
-            if self.board.falling is not None:
-                # Add the cells of the falling block for drawing. 
-                for (x, y) in self.board.falling:
-                    self.draw_cell(x, y, self.board.falling.color,
-                                   self.board.falling.shape)
-
-            if self.board.next is not None:
-                # Add the cells of the next block for drawing.
-                width = self.board.next.right - self.board.next.left
-                for (x, y) in self.board.next:
-                    self.draw_cell(x + BOARD_WIDTH + 2.5 - width/2, y+4,
-                                   self.board.next.color,
-                                   self.board.next.shape)
-
-            for i in range(self.board.bombs_remaining):
-                self.draw_cell(BOARD_WIDTH + 0.25 + i*1.1,10, "white", Shape.B)
-
-            x = BOARD_WIDTH * self.CELL_SIZE + 1
-            y = BOARD_HEIGHT * self.CELL_SIZE
-            self.canvas.create_line(x, 0, x, y, fill='blue')
-
-            self.after(DRAW_INTERVAL, self.draw)
+        # Draw the latest snapshot of the board, without holding up the
+        # game.
+        board = self.board.snapshot
+        self.update_score(board)
+        self.update_discards(board)
+        self.update_bombs(board)
+        self.update_next(board.next)
+
+        # Only look at the rows that changed since the last frame, and at
+        # where the falling block was and is.
+        cells = set(self.falling)
+        for y in board.changed_rows(self.cells_version):
+            cells.update((x, y) for x in range(board.width))
+        falling = ()
+        if board.falling is not None:
+            falling = board.falling.cells
+            falling_look = BOMB if board.falling.shape is Shape.B \
+                else board.falling.color
+            cells |= falling
+
+        for cell in cells:
+            look = falling_look if cell in falling \
+                else board.cellcolor.get(cell)
+            if self.drawn.get(cell) != look:
+                self.paint_cell(cell, look)
+                self.drawn[cell] = look
+        self.cells_version = board.cells_version
+        self.falling = falling
+
+        self.after(DRAW_INTERVAL, self.draw)
 
 
 class UserPlayer(Player):
@@ -241,7 +355,7 @@ class UserPlayer(Player):
                 self.next_move = None
 
 
-def run():
+def run(argv=None):
     root = Tk()
 
     # Try making window a dialog if the system allows it.
@@ -250,21 +364,27 @@ def run():
     except TclError:
         pass
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     if args.manual:
         player = UserPlayer(root)
     else:
         player = SelectedPlayer()
 
     adversary = RandomAdversary(DEFAULT_SEED, BLOCK_LIMIT)
-    board = Board(BOARD_WIDTH, BOARD_HEIGHT)
+    board, moves = start_game(args, player, adversary)
+
+    # When not playing manually, allow some time to see the move. Frames
+    # are drawn at their own rate, so faster speeds skip moves.
+    if args.manual:
+        pacer = Pacer(0, None)
+    else:
+        pacer = Pacer(0.05, SPEED_NAMES[args.speed])
+        root.bind("<Key>", lambda event: pacer.key(event.char))
 
     def runner():
         try:
-            for move in board.run(player, adversary):
-                # When not playing manually, allow some time to see the move.
-                if not args.manual:
-                    sleep(0.05)
+            for move in moves:
+                pacer.pause()
         except BlockLimitException:
             print("Out of blocks")
         print("Score=", board.score)